@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask_login import UserMixin
+
+
+class CachedUser(UserMixin):
+    # What an authenticated request needs to know about its user, detached
+    # from any session so it can be shared between requests. Code that
+    # changes the user (change_password) loads the real User row instead.
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username
+        }
+
+
+class UserCache:
+    # TTL + LRU cache for the Flask-Login user loader, so authenticated
+    # requests don't each pay a SELECT on users. Entries expire after ttl
+    # seconds, which bounds how long other workers serve a stale user after
+    # a change they weren't told about.
+
+    def __init__(self, ttl=60, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class LoginRateLimiter:
+    # Sliding-window limit on failed logins per client address and username,
+    # kept in process memory. Successful logins clear the history.
+
+    def __init__(self, max_failures=5, window=300, max_keys=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return None
+        return attempts
+
+    def retry_after(self, key):
+        # Seconds until another attempt is allowed, or 0 if allowed now
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._recent(key, now)
+            if attempts is None or len(attempts) < self.max_failures:
+                return 0
+            return int(attempts[0] + self.window - now) + 1
+
+    def record_failure(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) >= self.max_keys:
+                # Many distinct usernames; drop everything outside the window
+                for stale in list(self._failures):
+                    self._recent(stale, now)
+            self._recent(key, now)
+            self._failures.setdefault(key, deque()).append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+def hash_rounds(password_hash):
+    # bcrypt hashes look like $2b$12$<salt+hash>; the middle field is log2(rounds)
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
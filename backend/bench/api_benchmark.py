@@ -0,0 +1,209 @@
+"""Latency and throughput of the main API endpoints, saved as JSON.
+
+    DATABASE_URL=postgresql://... python -m bench.api_benchmark --products 10000 --sales 1000000 \\
+        --concurrency 1,8 --output results.json --baseline previous.json
+
+Tops the database up with bench.datagen, then drives each scenario through
+the Flask test client: sequentially, then from N threads with their own
+logged-in clients. Reports p50/p95/p99 latency and requests per second.
+With --baseline, p95 and throughput are compared to an earlier results file
+and the run exits non-zero if any scenario regressed beyond --max-regression.
+
+create_sale really writes sales; a handful of products are restocked first
+so the runs don't fail on stock. Use a throwaway database.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app import create_app
+from init_db import init_database
+from models import db, Product, Sale
+from bench.datagen import generate_products, generate_sales, FIRST_NAMES, LAST_NAMES
+
+RESTOCKED_PRODUCTS = 50
+
+
+def scenarios(product_ids, sale_ids):
+    # name -> function(client, rng) returning the response
+    def sale_body(rng):
+        return {
+            'customer_name': 'Benchmark',
+            'payment_method': 'cash',
+            'items': [{'product_id': rng.choice(product_ids), 'quantity': 1, 'price': 10}]
+        }
+
+    return {
+        'get_products': lambda c, rng: c.get('/api/products'),
+        'get_sales': lambda c, rng: c.get('/api/sales', query_string={'limit': 50}),
+        'get_sales_search': lambda c, rng: c.get(
+            '/api/sales', query_string={'search': rng.choice(FIRST_NAMES + LAST_NAMES), 'limit': 50}
+        ),
+        'create_sale': lambda c, rng: c.post('/api/sales', json=sale_body(rng)),
+        'generate_invoice': lambda c, rng: c.get(f'/api/sales/{rng.choice(sale_ids)}/invoice'),
+        'get_dashboard_stats': lambda c, rng: c.get('/api/dashboard/stats'),
+    }
+
+
+def login(app, password):
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'username': 'admin', 'password': password})
+    if response.status_code != 200:
+        raise RuntimeError(f'login failed with {response.status_code}')
+    return client
+
+
+def percentile(sorted_samples, p):
+    index = min(len(sorted_samples) - 1, max(0, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples, errors, elapsed):
+    samples = sorted(samples)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 2),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+    }
+
+
+def run(app, scenario, requests, concurrency, password, seed):
+    # Splits `requests` over `concurrency` threads, each with its own client
+    clients = [login(app, password) for _ in range(concurrency)]
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        mine = []
+        failed = 0
+        for _ in range(requests // concurrency + (n < requests % concurrency)):
+            started = time.perf_counter()
+            response = scenario(clients[n], rng)
+            response.get_data()
+            mine.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                failed += 1
+        with lock:
+            samples.extend(mine)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarize(samples, errors[0], time.perf_counter() - started)
+
+
+def compare(results, baseline, max_regression):
+    # Returns the (scenario, concurrency, metric, old, new) entries that got
+    # worse by more than max_regression percent
+    regressions = []
+    print(f"\n{'vs baseline':<24}{'conc':>6}{'p95 ms':>18}{'req/s':>18}")
+    for name, runs in results['scenarios'].items():
+        for concurrency, new in runs.items():
+            old = baseline.get('scenarios', {}).get(name, {}).get(concurrency)
+            if not old:
+                continue
+            p95 = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+            rps = (old['throughput_rps'] - new['throughput_rps']) / old['throughput_rps'] * 100 if old['throughput_rps'] else 0
+            print(f"{name:<24}{concurrency:>6}{old['p95_ms']:>9.1f} ->{new['p95_ms']:>6.1f}"
+                  f"{old['throughput_rps']:>9.1f} ->{new['throughput_rps']:>6.1f}")
+            if p95 > max_regression:
+                regressions.append((name, concurrency, 'p95_ms', old['p95_ms'], new['p95_ms']))
+            if rps > max_regression:
+                regressions.append((name, concurrency, 'throughput_rps', old['throughput_rps'], new['throughput_rps']))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--sales', type=int, default=100_000)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and concurrency level')
+    parser.add_argument('--concurrency', default='1,8')
+    parser.add_argument('--scenarios', help='comma-separated subset to run')
+    parser.add_argument('--output', default='api_benchmark.json')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--max-regression', type=float, default=20, help='percent')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        if Product.query.count() < args.products:
+            generate_products(args.products - Product.query.count())
+        if Sale.query.count() < args.sales:
+            print(f"Generating {args.sales - Sale.query.count()} synthetic sales...")
+            generate_sales(args.sales - Sale.query.count())
+
+        # Synthetic rows bypass the ledger and sales were never decremented
+        product_ids = [p for p, in db.session.query(Product.id).filter(Product.active == db.true())
+                       .order_by(Product.id).limit(RESTOCKED_PRODUCTS)]
+        db.session.execute(db.update(Product).where(Product.id.in_(product_ids)).values(quantity=10_000_000))
+        db.session.commit()
+        rng = random.Random(args.seed)
+        sale_ids = [s for s, in db.session.query(Sale.id)]
+        sale_ids = rng.sample(sale_ids, min(len(sale_ids), 5000))
+        counts = {'products': Product.query.count(), 'sales': Sale.query.count()}
+        dialect = db.engine.dialect.name
+
+    available = scenarios(product_ids, sale_ids)
+    selected = args.scenarios.split(',') if args.scenarios else list(available)
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    results = {
+        'started_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'database': dialect,
+        'rows': counts,
+        'python': platform.python_version(),
+        'requests': args.requests,
+        'scenarios': {},
+    }
+    print(f"{'scenario':<24}{'conc':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}")
+    for name in selected:
+        results['scenarios'][name] = {}
+        for concurrency in levels:
+            stats = run(app, available[name], args.requests, concurrency, args.password, args.seed)
+            results['scenarios'][name][str(concurrency)] = stats
+            print(f"{name:<24}{concurrency:>6}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+                  f"{stats['p99_ms']:>9.1f}{stats['throughput_rps']:>9.1f}{stats['errors']:>8}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for name, concurrency, metric, old, new in regressions:
+            print(f"REGRESSION {name} x{concurrency} {metric}: {old} -> {new}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
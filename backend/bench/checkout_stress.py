@@ -0,0 +1,124 @@
+"""Concurrent checkout stress test.
+
+Runs parallel tills against POST /api/sales through the Flask test client
+and checks the invariants the checkout path guarantees: no duplicate invoice
+numbers, no oversold stock, and every unit sold accounted for. Reports
+throughput for each worker count.
+
+    DATABASE_URL=postgresql://... python -m bench.checkout_stress --workers 1,2,4,8
+
+SQLite serializes writers, so against it throughput stays flat as workers
+are added; use PostgreSQL to see scaling.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+from app import create_app
+from init_db import init_database
+from models import db, Product, Sale, SaleItem
+
+PASSWORD = 'admin123'
+
+
+def setup_products(count, stock):
+    products = [
+        Product(name=f'Stress product {i}', sku=f'STRESS-{time.time_ns()}-{i}', price=100, quantity=stock)
+        for i in range(count)
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return [p.id for p in products]
+
+
+def till(app, product_ids, sales_per_worker, results, seed, password):
+    rng = random.Random(seed)
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'admin', 'password': password})
+    for _ in range(sales_per_worker):
+        # Several lines in random order, so lock ordering is exercised
+        lines = rng.sample(product_ids, k=min(3, len(product_ids)))
+        items = [{'product_id': pid, 'quantity': rng.randint(1, 3), 'price': 100} for pid in lines]
+        response = client.post('/api/sales', json={'items': items})
+        results.append(response.status_code)
+
+
+def run(app, workers, sales_per_worker, product_ids, password):
+    results = []
+    threads = [
+        threading.Thread(target=till, args=(app, product_ids, sales_per_worker, results, seed, password))
+        for seed in range(workers)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def check_invariants(product_ids, stock):
+    problems = []
+    duplicates = (
+        db.session.query(Sale.invoice_number)
+        .group_by(Sale.invoice_number)
+        .having(db.func.count() > 1)
+        .all()
+    )
+    if duplicates:
+        problems.append(f'duplicate invoice numbers: {duplicates[:5]}')
+
+    for product in Product.query.filter(Product.id.in_(product_ids)):
+        sold = (
+            db.session.query(db.func.coalesce(db.func.sum(SaleItem.quantity), 0))
+            .filter(SaleItem.product_id == product.id)
+            .scalar()
+        )
+        if product.quantity < 0:
+            problems.append(f'{product.sku} oversold: quantity {product.quantity}')
+        if product.quantity + sold != stock:
+            problems.append(f'{product.sku} lost units: {product.quantity} on hand + {sold} sold != {stock}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--sales-per-worker', type=int, default=50)
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=200,
+                        help='units per product; keep it low enough that some sales are refused')
+    parser.add_argument('--password', default=PASSWORD)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+
+    failed = False
+    print(f"{'workers':>8}{'sales':>8}{'refused':>9}{'errors':>8}{'sales/s':>10}")
+    for workers in [int(w) for w in args.workers.split(',')]:
+        with app.app_context():
+            product_ids = setup_products(args.products, args.stock)
+
+        results, elapsed = run(app, workers, args.sales_per_worker, product_ids, args.password)
+
+        created = results.count(201)
+        refused = results.count(400)
+        errors = len(results) - created - refused
+        print(f"{workers:>8}{created:>8}{refused:>9}{errors:>8}{created / elapsed:>10.1f}")
+
+        with app.app_context():
+            problems = check_invariants(product_ids, args.stock)
+        for problem in problems:
+            print(f"  FAIL: {problem}")
+        failed = failed or bool(problems) or errors > 0
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
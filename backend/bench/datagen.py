@@ -0,0 +1,144 @@
+"""Synthetic products, sales and sale items at benchmark scale.
+
+    DATABASE_URL=postgresql://... python -m bench.datagen --products 100000 --sales 10000000
+
+Tops the database up to the requested row counts (existing rows count), so
+it can be re-run to grow a dataset. Without DATABASE_URL it fills the local
+SQLite database. Sales get 1..--max-items items each, so sale_items ends up
+at roughly 2.5x the sales count.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import dashboard
+import stock_ledger
+from app import create_app
+from init_db import init_database
+from models import db, Product, Sale, SaleItem
+
+FIRST_NAMES = ['Thabo', 'Priya', 'John', 'Ayesha', 'Sipho', 'Maria', 'Kevin', 'Nomsa', 'Ravi', 'Lerato']
+LAST_NAMES = ['Naidoo', 'Dlamini', 'Smith', 'Pillay', 'Mokoena', 'van der Merwe', 'Khumalo', 'Govender']
+PAYMENT_METHODS = ['cash', 'card', 'eft']
+CATEGORIES = ['C.V. Joints', 'Boots', 'Drive Shafts', 'Bearings', 'Hubs', 'Clamps', 'Grease']
+
+
+def random_registration(rng):
+    letters = ''.join(rng.choice('ABCDEFGHJKLMNPRSTVWXYZ') for _ in range(2))
+    return f"{letters} {rng.randint(100, 999)}-{rng.randint(100, 999)}"
+
+
+def generate_products(count, batch_size=10000, seed=42):
+    # Bulk-inserts synthetic products and returns the number written
+    rng = random.Random(seed)
+    first_id = (db.session.query(db.func.max(Product.id)).scalar() or 0) + 1
+    now = datetime.utcnow()
+
+    written = 0
+    while written < count:
+        rows = []
+        for n in range(written, min(written + batch_size, count)):
+            price = Decimal(rng.randint(2000, 500000)) / 100
+            rows.append({
+                'name': f'{rng.choice(CATEGORIES)} part {first_id + n}',
+                'sku': f'GEN-{first_id + n:08d}',
+                'description': '',
+                'price': price,
+                'cost': (price * Decimal(rng.uniform(0.4, 0.8))).quantize(Decimal('0.01')),
+                'quantity': rng.randint(0, 200),
+                'min_stock': rng.randint(2, 10),
+                'category': rng.choice(CATEGORIES),
+                'active': rng.random() > 0.05,
+                'created_at': now,
+                'updated_at': now,
+            })
+        created = db.session.execute(db.insert(Product).returning(Product.id, Product.quantity), rows)
+        stock_ledger.record_many([(product_id, quantity, 'created', None) for product_id, quantity in created])
+        db.session.commit()
+        written += len(rows)
+
+    dashboard.reconcile(fix=True)
+    return written
+
+
+def generate_sales(count, batch_size=10000, seed=42, start=None, years=3, max_items=4):
+    # Bulk-inserts synthetic sales spread over the given number of years
+    # before start, each with 1..max_items items drawn from the existing
+    # products (no items if there are none). Returns the number of sales.
+    rng = random.Random(seed)
+    start = start or datetime.utcnow()
+    first_id = (db.session.query(db.func.max(Sale.id)).scalar() or 0) + 1
+    products = db.session.query(Product.id, Product.price).all()
+    span_minutes = 60 * 24 * 365 * years
+
+    written = 0
+    while written < count:
+        sales = []
+        items = []
+        for n in range(written, min(written + batch_size, count)):
+            lines = []
+            if products:
+                for product_id, price in rng.sample(products, k=min(rng.randint(1, max_items), len(products))):
+                    quantity = rng.randint(1, 4)
+                    lines.append({'product_id': product_id, 'quantity': quantity,
+                                  'price': price, 'subtotal': price * quantity})
+            total = sum(line['subtotal'] for line in lines) if lines else Decimal(rng.randint(5000, 500000)) / 100
+            sales.append({
+                'invoice_number': f'INV-{first_id + n:07d}',
+                'customer_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'customer_email': '',
+                'vehicle_registration': random_registration(rng),
+                'total': total,
+                'tax': 0,
+                'discount': 0,
+                'payment_method': rng.choice(PAYMENT_METHODS),
+                'status': 'completed',
+                'created_at': start - timedelta(minutes=rng.randint(0, span_minutes)),
+            })
+            items.append(lines)
+
+        sale_ids = db.session.scalars(
+            db.insert(Sale).returning(Sale.id, sort_by_parameter_order=True), sales
+        ).all()
+        item_rows = [dict(line, sale_id=sale_id) for sale_id, lines in zip(sale_ids, items) for line in lines]
+        if item_rows:
+            db.session.execute(db.insert(SaleItem), item_rows)
+        db.session.commit()
+        written += len(sales)
+
+    # Rows inserted behind the endpoints' backs; bring the summary up to date
+    dashboard.reconcile(fix=True)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--sales', type=int, default=100_000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--max-items', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        init_database()
+        missing = args.products - Product.query.count()
+        if missing > 0:
+            started = time.perf_counter()
+            generate_products(missing, batch_size=args.batch_size, seed=args.seed)
+            print(f"{missing} products in {time.perf_counter() - started:.1f}s")
+        missing = args.sales - Sale.query.count()
+        if missing > 0:
+            started = time.perf_counter()
+            generate_sales(missing, batch_size=args.batch_size, seed=args.seed,
+                           years=args.years, max_items=args.max_items)
+            print(f"{missing} sales in {time.perf_counter() - started:.1f}s")
+        print(f"products {Product.query.count()}, sales {Sale.query.count()}, "
+              f"sale_items {SaleItem.query.count()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Invoice emails end to end: checkout queues a job, `flask run-worker
+--drain` sends it through an SMTP stand-in.
+
+    pip install aiosmtpd    # development only, not in requirements.txt
+    python -m bench.invoice_email_check
+
+Creates the app on a throwaway SQLite database, starts an aiosmtpd server
+on a free local port, makes SALES sales with a customer_email, runs the
+run-worker command with --drain and exits non-zero unless each customer
+received one message with the sale's invoice attached as a PDF. Suitable as
+a CI gate.
+"""
+import email
+import email.policy
+import os
+import socket
+import sys
+import tempfile
+
+SALES = 3
+PASSWORD = 'admin123'
+
+
+class Inbox:
+    # aiosmtpd handler keeping every message it receives
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(email.message_from_bytes(envelope.content, policy=email.policy.default))
+        return '250 Message accepted for delivery'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        sys.exit('Install aiosmtpd to run this check: pip install aiosmtpd')
+
+    inbox = Inbox()
+    port = free_port()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'invoice_email.db')}"
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('DEFAULT_PASSWORD', PASSWORD)
+    os.environ['SMTP_HOST'] = 'localhost'
+    os.environ['SMTP_PORT'] = str(port)
+    os.environ['SMTP_STARTTLS'] = 'false'
+    os.environ['INVOICE_EMAILS'] = 'true'
+
+    # Config reads the environment at import time
+    from app import create_app
+    from init_db import init_database
+    from models import db, Job, Product
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        product = Product(name='Invoice email product', sku='INVOICE-EMAIL', price=10, quantity=100)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'admin', 'password': os.environ['DEFAULT_PASSWORD']})
+    expected = {}
+    for n in range(SALES):
+        address = f'customer{n}@example.com'
+        response = client.post('/api/sales', json={
+            'customer_name': f'Customer {n}',
+            'customer_email': address,
+            'items': [{'product_id': product_id, 'quantity': 1, 'price': 10}],
+        })
+        if response.status_code != 201:
+            sys.exit(f'POST /api/sales -> {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        expected[address] = response.get_json()['invoice_number']
+
+    controller = Controller(inbox, hostname='localhost', port=port)
+    controller.start()
+    try:
+        result = app.test_cli_runner().invoke(args=['run-worker', '--drain'])
+    finally:
+        controller.stop()
+    if result.exit_code != 0:
+        sys.exit(f'run-worker --drain exited with {result.exit_code}:\n{result.output}')
+
+    failed = False
+    received = {message['To']: message for message in inbox.messages}
+    for address, invoice_number in expected.items():
+        message = received.get(address)
+        attachments = list(message.iter_attachments()) if message else []
+        pdfs = [part for part in attachments if part.get_content_type() == 'application/pdf']
+        ok = (message is not None and invoice_number in message['Subject'] and len(pdfs) == 1
+              and pdfs[0].get_filename() == f'{invoice_number}.pdf'
+              and pdfs[0].get_content().startswith(b'%PDF'))
+        failed = failed or not ok
+        print(f"{address:<28}{invoice_number:<16}{'ok' if ok else 'FAIL'}")
+
+    with app.app_context():
+        statuses = dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all())
+    print(f'messages received: {len(inbox.messages)}, jobs: {statuses}')
+    failed = failed or len(inbox.messages) != SALES or statuses != {'done': SALES}
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Serial vs process-pool invoice rendering throughput.
+
+    python -m bench.invoice_export_benchmark --invoices 200 --workers 1,2,4,8
+
+Renders synthetic invoice snapshots with the real layout, without a
+database, so the numbers isolate ReportLab CPU time.
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from types import SimpleNamespace
+
+from invoice_render import render_invoice
+
+
+def synthetic_snapshots(count, seed=42):
+    rng = random.Random(seed)
+    snapshots = []
+    for n in range(1, count + 1):
+        items = []
+        for _ in range(rng.randint(1, 8)):
+            price = Decimal(rng.randint(100, 500000)) / 100
+            quantity = rng.randint(1, 4)
+            items.append(SimpleNamespace(
+                quantity=quantity,
+                price=price,
+                subtotal=price * quantity,
+                product=SimpleNamespace(name=f'C.V. Joint part {rng.randint(1, 999)}')
+            ))
+        subtotal = sum(item.subtotal for item in items)
+        snapshots.append(SimpleNamespace(
+            id=n,
+            invoice_number=f'INV-{n:05d}',
+            customer_name=f'Customer {n}',
+            tax=Decimal('0.00'),
+            total=subtotal,
+            items=items
+        ))
+    return snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=200)
+    parser.add_argument('--workers', default='1,2,4,8')
+    args = parser.parse_args()
+
+    snapshots = synthetic_snapshots(args.invoices)
+
+    # Warm the per-process template before timing
+    render_invoice(snapshots[0])
+    started = time.perf_counter()
+    for snapshot in snapshots:
+        render_invoice(snapshot)
+    serial = args.invoices / (time.perf_counter() - started)
+    print(f"{'mode':<12}{'invoices/s':>12}{'speedup':>10}")
+    print(f"{'serial':<12}{serial:>12.1f}{1.0:>10.2f}")
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            # Start the workers and warm their templates outside the timing
+            list(pool.map(render_invoice, snapshots[:workers]))
+            started = time.perf_counter()
+            for _ in pool.map(render_invoice, snapshots, chunksize=4):
+                pass
+            rate = args.invoices / (time.perf_counter() - started)
+        print(f"{f'pool x{workers}':<12}{rate:>12.1f}{rate / serial:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
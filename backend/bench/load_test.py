@@ -0,0 +1,111 @@
+"""Requests/second of the dev server vs gunicorn at several worker counts.
+
+    DATABASE_URL=postgresql://... python -m bench.load_test --workers 1,2,4 --clients 16
+
+Each configuration is started as a subprocess on a local port and driven by
+concurrent keep-alive clients for a fixed duration. Run `python init_db.py`
+against the same DATABASE_URL first.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(kind, port, workers=None):
+    if kind == 'dev':
+        cmd = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port)]
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+               '--bind', f'127.0.0.1:{port}', 'app:create_app()']
+    process = subprocess.Popen(cmd, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/auth/check')
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{" ".join(cmd)} did not start')
+
+
+def login(port, password):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/api/auth/login', json.dumps({'username': 'admin', 'password': password}),
+                 {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f'login failed with {response.status}')
+    return response.getheader('Set-Cookie').split(';')[0]
+
+
+def client(port, path, cookie, stop_at, counts):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    done = errors = 0
+    while time.time() < stop_at:
+        try:
+            conn.request('GET', path, headers={'Cookie': cookie})
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                done += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+    counts.append((done, errors))
+
+
+def measure(port, path, clients, duration, password):
+    cookie = login(port, password)
+    counts = []
+    stop_at = time.time() + duration
+    threads = [threading.Thread(target=client, args=(port, path, cookie, stop_at, counts)) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done = sum(c[0] for c in counts)
+    errors = sum(c[1] for c in counts)
+    return done / duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--path', default='/api/dashboard/stats')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+
+    configs = [('dev server', 'dev', None)] + [
+        (f'gunicorn x{w}', 'gunicorn', int(w)) for w in args.workers.split(',')
+    ]
+    print(f"{'server':<16}{'req/s':>10}{'errors':>8}")
+    for label, kind, workers in configs:
+        process = start_server(kind, args.port, workers)
+        try:
+            rate, errors = measure(args.port, args.path, args.clients, args.duration, args.password)
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{label:<16}{rate:>10.1f}{errors:>8}")
+
+
+if __name__ == '__main__':
+    main()
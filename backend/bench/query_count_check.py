@@ -0,0 +1,101 @@
+"""SQL statements per request for the sale endpoints, with fixed budgets.
+
+    python -m bench.query_count_check
+
+Creates the app on a throwaway SQLite database, counts the statements each
+request issues (via before_cursor_execute on the engine) for sales with 1
+and with MANY_LINES items, and exits non-zero if any endpoint's count
+differs from its budget, i.e. if it issues a query per line again. Suitable
+as a CI gate.
+"""
+import os
+import sys
+import tempfile
+
+MANY_LINES = 25
+PASSWORD = 'admin123'
+
+# Statements per request, whatever the number of lines. Reads are the sales
+# plus one selectin query for all their items with product names joined;
+# checkout's writes are batched across lines
+BUDGETS = {
+    'get_sale': 2,
+    'get_sales_batch': 2,
+    'create_sale': 9,
+    'generate_invoice': 2,
+}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def main():
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'query_count.db')}"
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('DEFAULT_PASSWORD', PASSWORD)
+    os.environ['INVOICE_EMAILS'] = 'false'
+
+    # Config reads the environment at import time
+    from sqlalchemy import event
+    from app import create_app
+    from init_db import init_database
+    from models import db, Product
+
+    app = create_app()
+    counter = StatementCounter()
+    with app.app_context():
+        init_database()
+        products = [
+            Product(name=f'Query count product {i}', sku=f'QC-{i}', price=10, quantity=1000)
+            for i in range(MANY_LINES)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        product_ids = [p.id for p in products]
+        event.listen(db.engine, 'before_cursor_execute', counter)
+
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'admin', 'password': os.environ['DEFAULT_PASSWORD']})
+
+    def count(method, url, **kwargs):
+        counter.count = 0
+        response = client.open(url, method=method, **kwargs)
+        if response.status_code >= 400:
+            sys.exit(f'{method} {url} -> {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return counter.count, response
+
+    def sale_body(lines):
+        return {'items': [{'product_id': pid, 'quantity': 1, 'price': 10} for pid in product_ids[:lines]]}
+
+    # Warm up: the first sale reserves a block of invoice numbers and the
+    # first invoice loads the template, neither of which repeats per request
+    _, warmup = count('POST', '/api/sales', json=sale_body(1))
+    count('GET', f"/api/sales/{warmup.get_json()['id']}/invoice")
+
+    failed = False
+    print(f"{'endpoint':<20}{'1 line':>8}{f'{MANY_LINES} lines':>10}{'budget':>8}")
+    counts = {name: [] for name in BUDGETS}
+    for lines in (1, MANY_LINES):
+        statements, response = count('POST', '/api/sales', json=sale_body(lines))
+        counts['create_sale'].append(statements)
+        sale_id = response.get_json()['id']
+        counts['get_sale'].append(count('GET', f'/api/sales/{sale_id}')[0])
+        counts['get_sales_batch'].append(count('GET', f'/api/sales/batch?ids={warmup.get_json()["id"]},{sale_id}')[0])
+        counts['generate_invoice'].append(count('GET', f'/api/sales/{sale_id}/invoice')[0])
+
+    for name, budget in BUDGETS.items():
+        few, many = counts[name]
+        ok = few == many == budget
+        failed = failed or not ok
+        print(f"{name:<20}{few:>8}{many:>10}{budget:>8}{'' if ok else '  FAIL'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Reporting query times on a multi-year synthetic dataset.
+
+    DATABASE_URL=postgresql://... python -m bench.reports_benchmark --sales 500000 --years 5
+
+Times each grouping over the whole range, cold (closed-period cache empty)
+and warm, through the real endpoint.
+"""
+import argparse
+import time
+
+from app import create_app
+from init_db import init_database
+from models import Product, Sale
+from reports import GROUPS, closed_reports
+from bench.datagen import generate_products, generate_sales
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--sales', type=int, default=500_000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        if Product.query.count() < args.products:
+            generate_products(args.products - Product.query.count())
+        if Sale.query.count() < args.sales:
+            print(f"Generating {args.sales - Sale.query.count()} synthetic sales over {args.years} years...")
+            generate_sales(args.sales - Sale.query.count(), years=args.years)
+
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'admin', 'password': args.password})
+    query = {'from': f'{time.gmtime().tm_year - args.years}-01-01'}
+
+    print(f"{'group_by':<16}{'rows':>8}{'cold ms':>10}{'warm ms':>10}")
+    for group_by in GROUPS:
+        closed_reports.clear()
+        started = time.perf_counter()
+        response = client.get(f'/api/reports/{group_by}', query_string=query)
+        cold = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        client.get(f'/api/reports/{group_by}', query_string=query)
+        warm = (time.perf_counter() - started) * 1000
+        print(f"{group_by:<16}{len(response.get_json()['rows']):>8}{cold:>10.1f}{warm:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
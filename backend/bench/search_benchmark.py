@@ -0,0 +1,70 @@
+"""Compare the original unindexed ILIKE search with the indexed search.
+
+    DATABASE_URL=postgresql://... python -m bench.search_benchmark --rows 1000000
+
+Run against PostgreSQL to measure the trigram indexes. On SQLite both paths
+scan, and ranking has to see every match, so the numbers only show the
+fallback's overhead.
+"""
+import argparse
+import statistics
+import time
+
+from app import create_app
+from init_db import init_database
+from models import db, Sale
+from search import search_sales
+from bench.datagen import generate_sales
+
+TERMS = ['naidoo', 'Thabo', 'ND 123', 'INV-00042', 'xyz-nothing']
+
+
+def ilike_search(term):
+    return Sale.query.filter(
+        db.or_(
+            Sale.customer_name.ilike(f'%{term}%'),
+            Sale.vehicle_registration.ilike(f'%{term}%'),
+            Sale.invoice_number.ilike(f'%{term}%')
+        )
+    ).order_by(Sale.created_at.desc()).limit(50).all()
+
+
+def indexed_search(term):
+    return search_sales(term, page=1, limit=50)
+
+
+def time_it(fn, term, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(term)
+        samples.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        existing = Sale.query.count()
+        if existing < args.rows:
+            print(f"Generating {args.rows - existing} synthetic sales...")
+            generate_sales(args.rows - existing)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+        print(f"{'term':<14}{'ILIKE ms':>12}{'indexed ms':>14}")
+        for term in TERMS:
+            legacy = time_it(ilike_search, term, args.repeat)
+            indexed = time_it(indexed_search, term, args.repeat)
+            print(f"{term:<14}{legacy:>12.1f}{indexed:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Product and sales listings: ORM + to_dict + stdlib JSON vs result rows + orjson.
+
+    DATABASE_URL=postgresql://... python -m bench.serialization_benchmark --rows 100000
+
+"before" rebuilds the listings the way the views used to (ORM objects,
+to_dict(), Flask's default JSON provider). "after" requests the real
+endpoints, uncompressed and then with gzip/brotli, and reports body sizes.
+The full sales listing is the NDJSON export, since /api/sales itself now
+always returns one page.
+"""
+import argparse
+import statistics
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+from app import create_app
+from init_db import init_database
+from models import Product, Sale
+from bench.datagen import generate_products, generate_sales
+
+LISTINGS = {
+    'products': ('/api/products', lambda: [p.to_dict() for p in Product.query.order_by(Product.id)]),
+    'sales': ('/api/sales?format=ndjson', lambda: [s.to_dict() for s in Sale.query.order_by(Sale.created_at.desc())]),
+}
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        if Product.query.count() < args.rows:
+            generate_products(args.rows - Product.query.count())
+        if Sale.query.count() < args.rows:
+            print(f"Generating {args.rows - Sale.query.count()} synthetic sales...")
+            generate_sales(args.rows - Sale.query.count(), max_items=1)
+
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'admin', 'password': args.password})
+    legacy_json = DefaultJSONProvider(app)
+
+    print(f"{'listing':<10}{'variant':<16}{'ms':>10}{'bytes':>12}")
+    for name, (path, legacy) in LISTINGS.items():
+        def before():
+            with app.test_request_context():
+                return legacy_json.response(legacy()).get_data()
+
+        ms, body = time_it(before, args.repeat)
+        print(f"{name:<10}{'before':<16}{ms:>10.1f}{len(body):>12}")
+        for label, encoding in (('after', 'identity'), ('after gzip', 'gzip'), ('after br', 'br')):
+            ms, response = time_it(lambda: client.get(path, headers={'Accept-Encoding': encoding}), args.repeat)
+            if encoding != 'identity' and response.headers.get('Content-Encoding') != encoding:
+                print(f"{name:<10}{label:<16}{'n/a (not available)':>22}")
+                continue
+            print(f"{name:<10}{label:<16}{ms:>10.1f}{len(response.data):>12}")
+
+
+if __name__ == '__main__':
+    main()
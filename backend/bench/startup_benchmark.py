@@ -0,0 +1,80 @@
+"""Backend cold-start time, with a budget.
+
+    python -m bench.startup_benchmark [--budget-ms 1000] [--top 10]
+
+Imports the app in a fresh interpreter under `python -X importtime`, reports
+the slowest imports and the time to create_app(), and exits non-zero when
+the import exceeds the budget or pulls in a module that should only load on
+first use (ReportLab). Suitable as a CI gate.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only; importing any of these at startup is a regression
+LAZY_MODULES = ['reportlab']
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+CREATE_APP_SNIPPET = (
+    "import time; started = time.perf_counter(); "
+    "from app import create_app; create_app(); "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def parse_importtime(stderr):
+    # [(module, cumulative microseconds, depth)]
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(2)), len(match.group(3)) // 2))
+    return imports
+
+
+def run_python(args, env):
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    # create_app() doesn't connect, so any URL will do
+    env = dict(os.environ, PREWARM_INVOICES='false')
+    env.setdefault('DATABASE_URL', 'sqlite://')
+
+    imports = parse_importtime(run_python(['-X', 'importtime', '-c', 'import app'], env).stderr)
+    total_ms = next(us for module, us, depth in imports if module == 'app' and depth == 0) / 1000
+    create_app_ms = float(run_python(['-c', CREATE_APP_SNIPPET], env).stdout.strip())
+
+    print(f"import app: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"import + create_app(): {create_app_ms:.1f} ms")
+    print("slowest top-level imports:")
+    top_level = sorted((i for i in imports if i[2] == 1), key=lambda i: i[1], reverse=True)
+    for module, us, _ in top_level[:args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {module}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f'import took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget')
+    loaded = {module.split('.')[0] for module, _, _ in imports}
+    for module in LAZY_MODULES:
+        if module in loaded:
+            failures.append(f'{module} is imported at startup')
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from models import db, Product, ProductTombstone
+
+# updated_at is stamped when a change is flushed, not when it commits, so a
+# slow transaction can commit a timestamp older than one a client has already
+# synced past. Sync tokens trail the server clock by this much and clients
+# merge by id, so such changes arrive on the next sync instead of never.
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def new_sync_token():
+    return (datetime.utcnow() - SYNC_OVERLAP).isoformat()
+
+
+def parse_sync_token(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('updated_since must be an ISO 8601 timestamp')
+
+
+def catalogue_version():
+    # One aggregate over indexed columns: any insert, update or delete
+    # changes the count or one of the maxima
+    count, last_updated = db.session.query(db.func.count(Product.id), db.func.max(Product.updated_at)).one()
+    last_deleted = db.session.query(db.func.max(ProductTombstone.deleted_at)).scalar()
+    last_modified = max([t for t in (last_updated, last_deleted) if t is not None], default=None)
+    raw = f'{count}:{last_updated and last_updated.isoformat()}:{last_deleted and last_deleted.isoformat()}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32], last_modified
+
+
+def changes_since(since):
+    products = Product.query.filter(Product.updated_at >= since).order_by(Product.id).all()
+    deleted = [
+        product_id for product_id, in
+        db.session.query(ProductTombstone.product_id).filter(ProductTombstone.deleted_at >= since)
+    ]
+    return products, deleted
@@ -0,0 +1,241 @@
+import math
+import threading
+
+from models import db, Product, Sale, SaleItem, Counter, invoice_number_seq
+
+INVOICE_COUNTER = 'invoice_number'
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+def format_invoice_number(value):
+    return f"INV-{value:05d}"
+
+
+def init_invoice_numbering(bind):
+    # Start numbering above every existing sale, matching the old
+    # "last sale id + 1" scheme for databases created before the sequence
+    with bind.begin() as conn:
+        max_id = conn.execute(db.select(db.func.max(Sale.id))).scalar() or 0
+        if bind.dialect.name == 'postgresql':
+            if max_id:
+                conn.execute(
+                    db.text("SELECT setval('invoice_number_seq', :max_id) "
+                            "WHERE :max_id >= (SELECT last_value FROM invoice_number_seq)"),
+                    {'max_id': max_id}
+                )
+            return
+
+        counter = conn.execute(
+            db.select(Counter.value).where(Counter.name == INVOICE_COUNTER)
+        ).scalar()
+        if counter is None:
+            conn.execute(db.insert(Counter).values(name=INVOICE_COUNTER, value=max_id))
+        elif counter < max_id:
+            conn.execute(
+                db.update(Counter).where(Counter.name == INVOICE_COUNTER).values(value=max_id)
+            )
+
+
+class InvoiceNumberAllocator:
+    # Hands out invoice numbers without touching the sales table, so
+    # concurrent checkouts never race on the invoice_number unique constraint.
+    # PostgreSQL uses nextval(), which takes no transactional locks. Other
+    # databases reserve a block of numbers per process from the counters row
+    # in a short transaction of its own; numbers left in a block when the
+    # process exits are skipped, just as sequence values are on rollback.
+
+    def __init__(self, block_size=20):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = -1
+
+    def allocate(self):
+        if db.engine.dialect.name == 'postgresql':
+            value = db.session.execute(db.select(invoice_number_seq.next_value())).scalar()
+            return format_invoice_number(value)
+
+        with self._lock:
+            if self._next > self._end:
+                self._reserve_block()
+            value = self._next
+            self._next += 1
+        return format_invoice_number(value)
+
+    def _reserve_block(self):
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.update(Counter)
+                .where(Counter.name == INVOICE_COUNTER)
+                .values(value=Counter.value + self.block_size)
+            )
+            end = conn.execute(
+                db.select(Counter.value).where(Counter.name == INVOICE_COUNTER)
+            ).scalar()
+        self._next = end - self.block_size + 1
+        self._end = end
+
+
+invoice_numbers = InvoiceNumberAllocator()
+
+
+def decrement_stock(quantities, remaining=None):
+    # quantities maps product_id -> units sold. One conditional UPDATE takes
+    # the units from every row that has enough, so stock can never go
+    # negative; if any row is short, InsufficientStock is raised and the
+    # caller rolls back. On PostgreSQL the rows are first locked in product
+    # id order, so concurrent checkouts lock them in the same order. The
+    # lock is FOR NO KEY UPDATE, the one the UPDATE takes anyway, which
+    # unlike FOR UPDATE doesn't conflict with the key-share locks that
+    # sale_items' foreign-key checks take. Callers must still decrement
+    # before inserting a sale's lines, or two checkouts can each hold a
+    # key-share lock the other's UPDATE waits for. Returns how many
+    # products dropped to low stock; the new quantities are written into
+    # `remaining` if one is passed.
+    if not quantities:
+        return 0
+    product_ids = sorted(quantities)
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(
+            db.select(Product.id).where(Product.id.in_(product_ids)).order_by(Product.id)
+            .with_for_update(key_share=True)
+        )
+    sold = db.case(quantities, value=Product.id)
+    rows = db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(product_ids), Product.quantity >= sold)
+        .values(quantity=Product.quantity - sold)
+        .returning(Product.id, Product.quantity, Product.min_stock, Product.active)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(rows) < len(product_ids):
+        updated = {row.id for row in rows}
+        raise InsufficientStock(next(pid for pid in product_ids if pid not in updated))
+
+    became_low = 0
+    for row in rows:
+        if remaining is not None:
+            remaining[row.id] = row.quantity
+        if row.active and row.quantity <= row.min_stock < row.quantity + quantities[row.id]:
+            became_low += 1
+    return became_low
+
+
+def load_products(product_ids, lock=False):
+    # Every product a checkout touches in one IN query. With lock=True the
+    # rows are locked in id order (FOR NO KEY UPDATE on PostgreSQL), the same
+    # order and lock decrement_stock uses.
+    query = Product.query.filter(Product.id.in_(set(product_ids))).order_by(Product.id)
+    if lock:
+        query = query.with_for_update(key_share=True)
+    return {p.id: p for p in query}
+
+
+MALFORMED_SALE = 'Each sale needs a list of items with product_id, quantity and price'
+# Optional text fields copied from the payload onto the sale
+SALE_TEXT_FIELDS = ('customer_name', 'customer_email', 'vehicle_make', 'vehicle_model',
+                    'vehicle_registration', 'vehicle_mileage', 'payment_method')
+
+
+def _is_whole(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def sale_product_ids(data):
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+        raise CheckoutError(MALFORMED_SALE)
+    try:
+        product_ids = [item['product_id'] for item in data['items']]
+    except (KeyError, TypeError):
+        raise CheckoutError(MALFORMED_SALE)
+    if not all(_is_whole(pid) for pid in product_ids):
+        raise CheckoutError('Item product_id must be an integer')
+    return product_ids
+
+
+def build_sale(data, products):
+    # Builds an unsaved Sale and its item rows from a checkout payload and
+    # returns them with the units to take from each product. No invoice
+    # number is assigned and nothing is written; see insert_sales.
+    sale_product_ids(data)
+    if not data['items']:
+        raise CheckoutError('A sale needs at least one item')
+    for item in data['items']:
+        if not _is_whole(item.get('quantity')) or item['quantity'] <= 0:
+            raise CheckoutError('Item quantity must be a positive whole number')
+        if not _is_number(item.get('price')):
+            raise CheckoutError('Item price must be a number')
+    if not all(_is_number(data.get(field, 0)) for field in ('discount', 'tax')):
+        raise CheckoutError('discount and tax must be numbers')
+    for field in SALE_TEXT_FIELDS:
+        value = data.get(field)
+        if value is not None and not isinstance(value, str):
+            raise CheckoutError(f'{field} must be text')
+        if value and len(value) > Sale.__table__.c[field].type.length:
+            raise CheckoutError(f'{field} is longer than {Sale.__table__.c[field].type.length} characters')
+
+    # Calculate totals
+    subtotal = sum(item['price'] * item['quantity'] for item in data['items'])
+    discount = data.get('discount', 0)
+    tax = data.get('tax', 0)
+    total = subtotal - discount + tax
+
+    sale = Sale(
+        customer_name=data.get('customer_name', ''),
+        customer_email=data.get('customer_email', ''),
+        vehicle_make=data.get('vehicle_make', ''),
+        vehicle_model=data.get('vehicle_model', ''),
+        vehicle_registration=data.get('vehicle_registration', ''),
+        vehicle_mileage=data.get('vehicle_mileage', ''),
+        total=total,
+        tax=tax,
+        discount=discount,
+        payment_method=data.get('payment_method', 'cash'),
+        status='completed'
+    )
+
+    items = []
+    quantities = {}
+    for item_data in data['items']:
+        product = products.get(item_data['product_id'])
+        if not product:
+            raise CheckoutError(f'Product {item_data["product_id"]} not found', 404)
+
+        items.append({
+            'product_id': product.id,
+            'quantity': item_data['quantity'],
+            'price': item_data['price'],
+            'subtotal': item_data['price'] * item_data['quantity']
+        })
+        quantities[product.id] = quantities.get(product.id, 0) + item_data['quantity']
+    return sale, items, quantities
+
+
+def insert_sales(sales):
+    # sales is [(sale, items)] from build_sale. The sales are flushed through
+    # the ORM, which assigns their ids, then every line goes in one
+    # executemany INSERT; left to the ORM, lines are inserted a statement
+    # each wherever it can't batch INSERT ... RETURNING (SQLite)
+    if not sales:
+        return
+    db.session.add_all([sale for sale, _ in sales])
+    db.session.flush()
+    db.session.execute(db.insert(SaleItem), [
+        dict(item, sale_id=sale.id) for sale, items in sales for item in items
+    ])
@@ -0,0 +1,64 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'text/csv', 'text/plain', 'text/html'}
+# Brotli's mid range compresses better than gzip 6 at about the same cost
+BROTLI_QUALITY = 4
+
+
+class ResponseCompression:
+    # Compresses buffered text responses of at least min_size bytes with
+    # brotli (if installed) or gzip, whichever the client accepts. Small
+    # bodies aren't worth the CPU; streamed responses (NDJSON, CSV export,
+    # invoice ZIPs) and binary types are left alone.
+
+    def __init__(self, min_size=1024, level=6):
+        self.min_size = min_size
+        self.level = level
+
+    def init_app(self, app):
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        app.after_request(self._compress)
+
+    def _encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def _compress(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._encoding()
+        if encoding is None:
+            return response
+        if encoding == 'br':
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=self.level)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed bytes differ from the identity encoding, so a strong
+        # validator would be wrong; views compare If-None-Match weakly
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,76 @@
+import random
+from decimal import Decimal
+
+import events
+from models import db, Product, Sale, DashboardSummary, needs_reorder
+
+SUMMARY_SLOTS = 8
+FIELDS = ('total_products', 'low_stock_count', 'total_sales', 'total_revenue')
+
+
+def is_low_stock(quantity, min_stock, active=True):
+    # Mirrors models.needs_reorder; form posts send numbers as strings
+    return bool(active) and int(quantity or 0) <= int(min_stock or 0)
+
+
+def record(**deltas):
+    # Adds deltas to the summary inside the caller's transaction, so the
+    # dashboard changes exactly when the write it describes commits
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    events.publish('dashboard', {
+        field: float(value) if isinstance(value, Decimal) else value for field, value in deltas.items()
+    })
+    slot = random.randrange(SUMMARY_SLOTS)
+    db.session.execute(
+        db.update(DashboardSummary)
+        .where(DashboardSummary.slot == slot)
+        .values({field: getattr(DashboardSummary, field) + value for field, value in deltas.items()})
+    )
+
+
+def read_summary():
+    row = db.session.query(*[db.func.coalesce(db.func.sum(getattr(DashboardSummary, f)), 0) for f in FIELDS]).one()
+    return dict(zip(FIELDS, row))
+
+
+def compute_summary():
+    # The figures from scratch; low stock counts active products only
+    return {
+        'total_products': Product.query.count(),
+        'low_stock_count': Product.query.filter(needs_reorder()).count(),
+        'total_sales': Sale.query.count(),
+        'total_revenue': db.session.query(db.func.sum(Sale.total)).scalar() or Decimal('0'),
+    }
+
+
+def reconcile(fix=False):
+    # Returns {field: (summary value, recomputed value)} for every field that
+    # drifted; with fix=True the summary is reset to the recomputed values
+    current = read_summary()
+    actual = compute_summary()
+    drift = {
+        field: (current[field], actual[field])
+        for field in FIELDS
+        if Decimal(str(current[field])) != Decimal(str(actual[field]))
+    }
+    if fix:
+        _reset(actual)
+        db.session.commit()
+    return drift
+
+
+def _reset(values):
+    db.session.query(DashboardSummary).delete()
+    db.session.add(DashboardSummary(slot=0, **values))
+    db.session.add_all([
+        DashboardSummary(slot=slot, total_products=0, low_stock_count=0, total_sales=0, total_revenue=0)
+        for slot in range(1, SUMMARY_SLOTS)
+    ])
+
+
+def init_summary():
+    if db.session.query(DashboardSummary.slot).count() != SUMMARY_SLOTS:
+        _reset(compute_summary())
+        db.session.commit()
@@ -0,0 +1,217 @@
+import itertools
+import json
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+from sqlalchemy import event
+
+from models import db, RoutingSession
+
+PG_CHANNEL = 'inventory_events'
+# NOTIFY payloads must be shorter than 8000 bytes
+PG_MAX_PAYLOAD = 7999
+HISTORY_SIZE = 1000
+# Tells clients to refetch instead of patching, e.g. after missed events
+RESYNC = json.dumps({'type': 'resync', 'data': {}})
+
+
+def publish(kind, data):
+    # Queues an event on the current session; it goes out when the session
+    # commits and is dropped if it rolls back, so clients never hear about a
+    # write that didn't happen
+    db.session.info.setdefault('pending_events', []).append((kind, data))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _send_pending(session):
+    # Best effort: the write has already committed, so a failure to publish
+    # is logged rather than failing a request the client would then retry.
+    # Clients that miss events catch up when they next resync.
+    pending = session.info.pop('pending_events', None)
+    if not pending:
+        return
+    try:
+        broadcaster.send([
+            json.dumps({'type': kind, 'data': data}, default=current_app.json.default)
+            for kind, data in pending
+        ])
+    except Exception:
+        current_app.logger.exception('Could not publish %d events', len(pending))
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop('pending_events', None)
+
+
+class LocalPubSub:
+    # Delivers straight to this process's subscribers. Enough for a single
+    # worker, and the stand-in for a shared bus in development and tests.
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def listen(self):
+        pass
+
+    def send(self, messages):
+        for message in messages:
+            self.deliver(message)
+
+
+class PostgresPubSub:
+    # Fans events out to every worker (on every host) through LISTEN/NOTIFY
+    # on the primary database. A process starts listening, on one dedicated
+    # connection, when its first client subscribes.
+
+    def __init__(self, deliver, engine, logger):
+        self.deliver = deliver
+        self.engine = engine
+        self.logger = logger
+        self._thread = None
+
+    def listen(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='event-listener', daemon=True)
+            self._thread.start()
+
+    def send(self, messages):
+        with self.engine.connect() as conn:
+            for message in messages:
+                size = len(message.encode('utf-8'))
+                if size > PG_MAX_PAYLOAD:
+                    # Too big for NOTIFY; tell clients to refetch instead
+                    self.logger.warning('Event of %d bytes sent as a resync', size)
+                    message = RESYNC
+                conn.execute(db.text('SELECT pg_notify(:channel, :message)'),
+                             {'channel': PG_CHANNEL, 'message': message})
+            conn.commit()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                self.logger.exception('Event listener lost its connection; reconnecting')
+            # Anything sent while disconnected is lost
+            self.deliver(RESYNC)
+            time.sleep(5)
+
+    def _listen(self):
+        conn = self.engine.raw_connection()
+        try:
+            dbapi = conn.dbapi_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f'LISTEN {PG_CHANNEL}')
+            while True:
+                if select.select([dbapi], [], [], 60) == ([], [], []):
+                    continue
+                dbapi.poll()
+                while dbapi.notifies:
+                    self.deliver(dbapi.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+class Broadcaster:
+    # Hands published events to every open /api/events stream in this
+    # process. Events are numbered per process; the last HISTORY_SIZE are
+    # kept so a reconnecting client can catch up from Last-Event-ID, and a
+    # client that is too far behind (or reconnects to another worker) is
+    # told to resync instead.
+
+    def __init__(self):
+        self.max_clients = 100
+        self.backend = LocalPubSub(self._deliver)
+        self._prefix = f'{os.getpid()}-{id(self):x}'
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_clients = app.config['EVENTS_MAX_CLIENTS']
+        if app.config['EVENTS_BACKEND'] == 'postgres':
+            with app.app_context():
+                self.backend = PostgresPubSub(self._deliver, db.engine, app.logger)
+        else:
+            self.backend = LocalPubSub(self._deliver)
+
+    def send(self, messages):
+        self.backend.send(messages)
+
+    def _deliver(self, message):
+        with self._lock:
+            entry = (f'{self._prefix}-{next(self._ids)}', message)
+            self._history.append(entry)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(entry)
+            except queue.Full:
+                # A stalled client; it gets a resync when it reconnects
+                self.unsubscribe(subscriber)
+
+    def subscribe(self, last_event_id=None):
+        # Returns (queue, backlog); backlog is None if the client must resync
+        self.backend.listen()
+        subscriber = queue.Queue(maxsize=HISTORY_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None, None
+            self._subscribers.add(subscriber)
+            backlog = []
+            if last_event_id:
+                ids = [entry_id for entry_id, _ in self._history]
+                if last_event_id in ids:
+                    backlog = list(self._history)[ids.index(last_event_id) + 1:]
+                else:
+                    backlog = None
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        return subscriber in self._subscribers
+
+    def stream(self, subscriber, backlog, duration, keepalive=15):
+        # The body of one /api/events response. Streams end after duration
+        # seconds (EventSource reconnects with Last-Event-ID), so a worker
+        # thread is never held indefinitely, and comment lines every
+        # keepalive seconds let disconnected clients be noticed.
+        try:
+            yield 'retry: 3000\n\n'
+            if backlog is None:
+                yield f'data: {RESYNC}\n\n'
+            else:
+                for entry in backlog:
+                    yield _format(entry)
+            deadline = time.monotonic() + duration
+            while self.is_subscribed(subscriber):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    entry = subscriber.get(timeout=min(keepalive, remaining))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield _format(entry)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def _format(entry):
+    entry_id, message = entry
+    return f'id: {entry_id}\ndata: {message}\n\n'
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,22 @@
+# Production WSGI server settings: gunicorn -c gunicorn.conf.py 'app:create_app()'
+# Run `python init_db.py` once before starting the workers.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Processes for CPU-bound work (invoice rendering, JSON), threads per process
+# for requests waiting on the database, plus one per /api/events stream a
+# worker may hold open
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4)) + int(os.getenv('EVENTS_MAX_CLIENTS', 8))
+worker_class = 'gthread'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+
+# Restart workers periodically to cap the effect of any slow leaks
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
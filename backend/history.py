@@ -0,0 +1,38 @@
+import hashlib
+
+from models import (
+    db, Product, Sale, SaleItem, registration_key, normalize_registration, email_key, normalize_email
+)
+from pagination import keyset_page
+from reports import report_inputs_version
+
+# kind -> (indexed expression, how a path value is normalized to match it)
+HISTORY_KEYS = {
+    'vehicle': (registration_key(Sale.vehicle_registration), normalize_registration),
+    'customer': (email_key(Sale.customer_email), normalize_email),
+}
+
+
+def history_key(kind, value):
+    return HISTORY_KEYS[kind][1](value)
+
+
+def history_version(kind, key):
+    # ETag for a vehicle's or customer's history: sales are never edited, so
+    # a count and the newest id (both from the history index) change exactly
+    # when a sale is added. Product names shown on items change only with
+    # the report inputs version, which, unlike the catalogue version, stock
+    # movements from other sales leave alone.
+    expression = HISTORY_KEYS[kind][0]
+    count, newest = db.session.query(db.func.count(Sale.id), db.func.max(Sale.id)).filter(expression == key).one()
+    raw = f'{kind}:{key}:{count}:{newest}:{report_inputs_version()}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def sale_history(kind, key, limit, cursor=None):
+    # One page of sales newest first, with items and product names joined
+    # into the same SELECT
+    query = Sale.query.options(
+        db.joinedload(Sale.items).joinedload(SaleItem.product).load_only(Product.name)
+    ).filter(HISTORY_KEYS[kind][0] == key)
+    return keyset_page(query, Sale, limit, cursor)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey
+
+MAX_KEY_LENGTH = 100
+POLL_INTERVAL = 0.05
+
+
+def request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class IdempotencyError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def check_key(key):
+    if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters', 400)
+
+
+class IdempotencyStore:
+    # Idempotency-Key handling for POST /api/sales. The first request with a
+    # key claims it in a short transaction of its own, so duplicates arriving
+    # meanwhile see the claim and wait for it instead of doing the work
+    # again. The sale and the key's sale_id commit together, so a key is
+    # either finished with exactly one sale or released for a retry.
+    # Keys expire after ttl; a claim older than lock_timeout belongs to a
+    # request that died and may be taken over. POST /api/sales/bulk uses the
+    # same table for per-sale keys: they are looked up together and recorded
+    # with their sales, and rows lock out a concurrent duplicate sync.
+
+    def __init__(self, ttl=timedelta(hours=24), lock_timeout=timedelta(seconds=60), wait=10):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.wait = wait
+
+    def init_app(self, app):
+        self.ttl = timedelta(hours=app.config['IDEMPOTENCY_TTL_HOURS'])
+        self.wait = app.config['IDEMPOTENCY_WAIT_SECONDS']
+
+    def claim(self, user_id, key, payload):
+        # Returns the sale id of a finished request with this key, or None
+        # once this request holds the key and should create the sale
+        check_key(key)
+        payload_hash = request_hash(payload)
+        if random.random() < 0.01:
+            self.evict()
+
+        deadline = time.monotonic() + self.wait
+        while True:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(db.insert(IdempotencyKey).values(
+                        user_id=user_id, key=key, request_hash=payload_hash, created_at=datetime.utcnow()
+                    ))
+                return None
+            except IntegrityError:
+                pass
+
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    db.select(IdempotencyKey.request_hash, IdempotencyKey.sale_id, IdempotencyKey.created_at)
+                    .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+                ).first()
+            if row is None:
+                continue  # released by a request that failed; claim it ourselves
+            if row.request_hash != payload_hash:
+                raise IdempotencyError('Idempotency-Key was already used for a different sale', 422)
+            if row.sale_id is not None:
+                return row.sale_id
+            if row.created_at < datetime.utcnow() - self.lock_timeout:
+                self._release(user_id, key, created_at=row.created_at)
+                continue
+            if time.monotonic() >= deadline:
+                raise IdempotencyError('A request with this Idempotency-Key is still in progress', 409)
+            time.sleep(POLL_INTERVAL)
+
+    def complete(self, user_id, key, sale_id):
+        # In the caller's transaction, so it commits with the sale
+        db.session.execute(
+            db.update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            .values(sale_id=sale_id)
+        )
+
+    def lookup(self, user_id, keys):
+        # {key: row} for the keys this user has already sent, for requests
+        # that check many keys at once (offline sync) instead of claiming them
+        if not keys:
+            return {}
+        rows = db.session.execute(
+            db.select(IdempotencyKey.key, IdempotencyKey.request_hash, IdempotencyKey.sale_id)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key.in_(set(keys)))
+        )
+        return {row.key: row for row in rows}
+
+    def record_many(self, user_id, entries):
+        # entries is [(key, payload, sale_id)] for sales created in the
+        # caller's transaction; a concurrent request that recorded one of the
+        # keys first makes this raise IntegrityError
+        if entries:
+            now = datetime.utcnow()
+            db.session.execute(db.insert(IdempotencyKey), [
+                {'user_id': user_id, 'key': key, 'request_hash': request_hash(payload),
+                 'sale_id': sale_id, 'created_at': now}
+                for key, payload, sale_id in entries
+            ])
+
+    def release(self, user_id, key):
+        # Frees an unfinished claim after the request failed; a no-op once
+        # the sale committed
+        self._release(user_id, key)
+
+    def _release(self, user_id, key, created_at=None):
+        condition = [IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.sale_id.is_(None)]
+        if created_at is not None:
+            condition.append(IdempotencyKey.created_at == created_at)
+        with db.engine.begin() as conn:
+            conn.execute(db.delete(IdempotencyKey).where(*condition))
+
+    def evict(self):
+        with db.engine.begin() as conn:
+            conn.execute(db.delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - self.ttl))
+
+
+idempotency_keys = IdempotencyStore()
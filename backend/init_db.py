@@ -0,0 +1,42 @@
+# One-shot database setup, run once per deploy before the web workers start:
+#
+#   python init_db.py
+#
+# Creates missing tables and indexes, seeds invoice numbering, the
+# dashboard summary and the opening stock snapshot, and creates the default
+# admin user on an empty database. Every step is idempotent.
+import os
+
+import dashboard
+import stock_ledger
+from app import create_app, bcrypt
+from checkout import init_invoice_numbering
+from models import db, User, create_indexes
+from reports import init_report_inputs
+from search import create_search_indexes
+
+
+def init_database():
+    db.create_all()
+    create_indexes(db.engine)
+    create_search_indexes(db.engine)
+    init_invoice_numbering(db.engine)
+    init_report_inputs(db.engine)
+    dashboard.init_summary()
+    stock_ledger.init_ledger()
+    
+    # Create default user if none exists
+    if User.query.count() == 0:
+        default_password = os.getenv('DEFAULT_PASSWORD', 'admin123')
+        hashed_password = bcrypt.generate_password_hash(default_password).decode('utf-8')
+        default_user = User(username='admin', password_hash=hashed_password)
+        db.session.add(default_user)
+        db.session.commit()
+        print(f"Default user created - Username: admin, Password: {default_password}")
+    
+    print("Database initialized!")
+
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        init_database()
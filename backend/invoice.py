@@ -0,0 +1,64 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Bump whenever the layout in invoice_render.py changes, so cached PDFs and
+# client ETags from the old layout stop matching
+TEMPLATE_VERSION = 1
+
+
+def prewarm():
+    # Load ReportLab and build the static template now rather than on the
+    # first invoice request
+    from invoice_render import get_template
+    get_template()
+
+
+def invoice_etag(sale_id):
+    # A completed sale never changes, so the sale id and template version
+    # identify the document without rendering it
+    return hashlib.sha256(f'invoice:{TEMPLATE_VERSION}:{sale_id}'.encode('utf-8')).hexdigest()[:32]
+
+
+class InvoiceCache:
+    # In-memory LRU of rendered PDFs, bounded by total size in bytes
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._entries.get(key)
+            if pdf is not None:
+                self._entries.move_to_end(key)
+            return pdf
+
+    def put(self, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = pdf
+            self._size += len(pdf)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+invoice_cache = InvoiceCache(int(os.getenv('INVOICE_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+
+
+def get_invoice_pdf(sale):
+    key = (sale.id, TEMPLATE_VERSION)
+    pdf = invoice_cache.get(key)
+    if pdf is None:
+        from invoice_render import render_invoice
+        pdf = render_invoice(sale)
+        invoice_cache.put(key, pdf)
+    return pdf
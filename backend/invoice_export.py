@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+
+from models import db, Sale
+from invoice import invoice_cache, TEMPLATE_VERSION
+
+EXPORT_WORKERS = int(os.getenv('INVOICE_EXPORT_WORKERS', os.cpu_count() or 2))
+LOAD_BATCH_SIZE = 100
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Spawned rather than forked: the pool is created lazily from a request
+    # thread, and forking a threaded server process isn't safe
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=EXPORT_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+
+def invoice_snapshot(sale):
+    # Plain, picklable copy of what render_invoice reads from a sale
+    return SimpleNamespace(
+        id=sale.id,
+        invoice_number=sale.invoice_number,
+        customer_name=sale.customer_name,
+        tax=sale.tax,
+        total=sale.total,
+        items=[
+            SimpleNamespace(
+                quantity=item.quantity,
+                price=item.price,
+                subtotal=item.subtotal,
+                product=SimpleNamespace(name=item.product.name)
+            )
+            for item in sale.items
+        ]
+    )
+
+
+class _ZipStream:
+    # Write-only file object for ZipFile; the zip is drained chunk by chunk
+    # so finished entries go to the client instead of accumulating
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_sale_ids(start, end):
+    query = db.session.query(Sale.id)
+    if start:
+        query = query.filter(Sale.created_at >= start)
+    if end:
+        query = query.filter(Sale.created_at < end)
+    return [sale_id for sale_id, in query.order_by(Sale.created_at, Sale.id)]
+
+
+def _snapshots(sale_ids):
+    for i in range(0, len(sale_ids), LOAD_BATCH_SIZE):
+        batch = sale_ids[i:i + LOAD_BATCH_SIZE]
+        sales = Sale.query_with_items().filter(Sale.id.in_(batch)).all()
+        for sale in sales:
+            yield invoice_snapshot(sale)
+        db.session.expunge_all()
+
+
+def stream_invoice_zip(sale_ids, progress=None):
+    # Yields a ZIP of invoice PDFs as renders finish in the process pool. At
+    # most two renders per worker are in flight, so memory doesn't grow with
+    # the size of the export.
+    from invoice_render import render_invoice
+
+    pool = get_pool()
+    out = _ZipStream()
+    archive = zipfile.ZipFile(out, mode='w', compression=zipfile.ZIP_STORED)
+    max_in_flight = EXPORT_WORKERS * 2
+    in_flight = {}
+    done_count = 0
+
+    def write_done(futures):
+        nonlocal done_count
+        for future in futures:
+            invoice_number = in_flight.pop(future)
+            archive.writestr(f'{invoice_number}.pdf', future.result())
+            done_count += 1
+            if progress:
+                progress(done_count, len(sale_ids))
+
+    for snapshot in _snapshots(sale_ids):
+        cached = invoice_cache.get((snapshot.id, TEMPLATE_VERSION))
+        if cached is not None:
+            archive.writestr(f'{snapshot.invoice_number}.pdf', cached)
+            done_count += 1
+            if progress:
+                progress(done_count, len(sale_ids))
+        else:
+            in_flight[pool.submit(render_invoice, snapshot)] = snapshot.invoice_number
+
+        if len(in_flight) >= max_in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            write_done(finished)
+        chunk = out.drain()
+        if chunk:
+            yield chunk
+
+    while in_flight:
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        write_done(finished)
+        chunk = out.drain()
+        if chunk:
+            yield chunk
+
+    archive.close()
+    yield out.drain()
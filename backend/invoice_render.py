@@ -0,0 +1,262 @@
+import os
+import threading
+from io import BytesIO
+from types import SimpleNamespace
+
+from reportlab.lib import colors
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, HRFlowable
+
+# Imported on first use (see invoice.get_invoice_pdf) so web workers don't
+# pay for loading ReportLab until an invoice is actually rendered.
+# Bump invoice.TEMPLATE_VERSION whenever the layout below changes.
+
+# Company Details
+COMPANY_NAME = "C.V. JOINT MAC"
+TAGLINE = "Specialising in * Sales * Service * Repairs<br/>& Reconditioning to all make of C.V. Joints"
+ADDRESS_LINE1 = "Shop 10, Peters Road"
+ADDRESS_LINE2 = "Springfield Park"
+EMAIL = "cvjointmac@gmail.com"
+TEL = "(031) 577 6049"
+AFTER_HOURS = "082 931 1198"
+FAX = "086 2733 861"
+
+LOGO_PATH = os.path.join(os.path.dirname(__file__), 'cv-joint-logo.jpg')
+
+FINE_PRINT_TEXT = """
+    <b>TERMS AND CONDITIONS:</b><br/>
+    1. No guarantee on C.V. Joint, if C.V. Boot is tampered with, broken or burst.<br/>
+    2. No guarantee on C.V. Joint if there is any defects relating to C.V. Joint.<br/>
+    3. We are not liable for any cost on C.V. Joints taken elsewhere during the guarantee period.<br/>
+    4. Goods remain the property of the seller until paid for in full.<br/>
+    5. Conditions of guarantee understood and goods received in good working order.<br/>
+    6. We are not liable for any towing costs.
+    """
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_template():
+    # Everything that doesn't depend on the sale - the stylesheet, derived
+    # paragraph and table styles, and the logo image data - is prepared once
+    # per process. Flowables themselves are still created per render because
+    # ReportLab stores layout state on them, so they can't be shared between
+    # concurrent builds.
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = _build_template()
+    return _template
+
+
+def _build_template():
+    styles = getSampleStyleSheet()
+
+    # Define grayscale colors
+    dark_gray = HexColor('#333333')
+    medium_gray = HexColor('#666666')
+
+    cv_joint_style = styles['Normal'].clone('CVJointStyle')
+    cv_joint_style.alignment = 1
+    cv_joint_style.fontSize = 14
+    cv_joint_style.textColor = dark_gray
+
+    company_style = styles['Heading1'].clone('CompanyStyle')
+    company_style.alignment = 1
+    company_style.fontSize = 24
+    company_style.textColor = dark_gray
+    company_style.fontName = 'Helvetica-Bold'
+
+    tagline_style = styles['Normal'].clone('TaglineStyle')
+    tagline_style.alignment = 1
+    tagline_style.fontSize = 9
+    tagline_style.textColor = medium_gray
+    tagline_style.fontStyle = 'italic'
+
+    fine_print_style = styles['Normal'].clone('FinePrint')
+    fine_print_style.fontSize = 8
+    fine_print_style.leading = 10
+    fine_print_style.textColor = dark_gray
+
+    sig_style = styles['Normal'].clone('SigStyle')
+    sig_style.fontSize = 10
+    sig_style.textColor = dark_gray
+
+    try:
+        with open(LOGO_PATH, 'rb') as f:
+            logo_bytes = f.read()
+    except OSError:
+        logo_bytes = None
+
+    return SimpleNamespace(
+        styles=styles,
+        dark_gray=dark_gray,
+        medium_gray=medium_gray,
+        cv_joint_style=cv_joint_style,
+        company_style=company_style,
+        tagline_style=tagline_style,
+        fine_print_style=fine_print_style,
+        sig_style=sig_style,
+        logo_bytes=logo_bytes,
+        header_style=TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('TEXTCOLOR', (0, 0), (-1, -1), dark_gray),
+            ('FONTSIZE', (0, 0), (-1, -1), 18),
+        ]),
+        contact_style=TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('TEXTCOLOR', (0, 0), (-1, -1), dark_gray),
+        ]),
+        vehicle_style=TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+        items_style=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), dark_gray),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, dark_gray),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, HexColor('#f5f5f5')])
+        ]),
+        totals_style=TableStyle([
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (2, 3), (-1, 3), 'Helvetica-Bold'),
+            ('FONTSIZE', (2, 3), (-1, 3), 12),
+            ('LINEABOVE', (2, 3), (-1, 3), 2, colors.black),
+            ('TOPPADDING', (2, 3), (-1, 3), 10),
+        ]),
+    )
+
+
+def render_invoice(sale):
+    t = get_template()
+    styles = t.styles
+
+    # Create PDF
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.75*inch, rightMargin=0.75*inch)
+    elements = []
+
+    # Invoice header - INVOICE and Number on same line
+    header_data = [[
+        Paragraph("<b>INVOICE</b>", styles['Title']),
+        Paragraph(f"<b>No.: {sale.invoice_number.replace('INV-', '')}</b>", styles['Title'])
+    ]]
+    header_table = Table(header_data, colWidths=[4*inch, 2.5*inch])
+    header_table.setStyle(t.header_style)
+    elements.append(header_table)
+    elements.append(Spacer(1, 0.15*inch))
+
+    # CV Joint Logo - fallback to text if the image is missing
+    if t.logo_bytes:
+        logo = Image(BytesIO(t.logo_bytes), width=3*inch, height=0.75*inch)
+        logo.hAlign = 'CENTER'
+        elements.append(logo)
+    else:
+        elements.append(Paragraph("═══╬═══○═══╬═══○═══╬═══", t.cv_joint_style))
+
+    elements.append(Spacer(1, 0.15*inch))
+
+    # Company Name - Centered
+    elements.append(Paragraph(f"<b>{COMPANY_NAME}</b>", t.company_style))
+    elements.append(Spacer(1, 0.1*inch))
+
+    # Tagline - Centered
+    elements.append(Paragraph(TAGLINE, t.tagline_style))
+    elements.append(Spacer(1, 0.25*inch))
+
+    # Address and Contact Info - Two columns
+    contact_left = f"{ADDRESS_LINE1}<br/>{ADDRESS_LINE2}<br/>E-mail: {EMAIL}"
+    contact_right = f"Tel.: {TEL}<br/>A/h: {AFTER_HOURS}<br/>Fax: {FAX}"
+
+    contact_data = [[
+        Paragraph(contact_left, styles['Normal']),
+        Paragraph(contact_right, styles['Normal'])
+    ]]
+    contact_table = Table(contact_data, colWidths=[3.25*inch, 3.25*inch])
+    contact_table.setStyle(t.contact_style)
+    elements.append(contact_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Divider line
+    elements.append(HRFlowable(width="100%", thickness=1, color=t.medium_gray))
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Vehicle Details Section
+    elements.append(Paragraph("<b>VEHICLE DETAILS:</b>", styles['Heading3']))
+    elements.append(Spacer(1, 0.1*inch))
+
+    vehicle_lines = [
+        [Paragraph("Make: _________________________________", styles['Normal']),
+         Paragraph("Model: _________________________________", styles['Normal'])],
+        [Paragraph("Mileage: _______________________________", styles['Normal']),
+         Paragraph("Other: _________________________________", styles['Normal'])]
+    ]
+    vehicle_table = Table(vehicle_lines, colWidths=[3.25*inch, 3.25*inch])
+    vehicle_table.setStyle(t.vehicle_style)
+    elements.append(vehicle_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Divider line
+    elements.append(HRFlowable(width="100%", thickness=1, color=t.medium_gray))
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Customer Info
+    if sale.customer_name:
+        elements.append(Paragraph(f"<b>CUSTOMER:</b> {sale.customer_name}", styles['Normal']))
+        elements.append(Spacer(1, 0.2*inch))
+
+    # Items table - NO BLANK ROWS, only purchased items
+    items_data = [['Qty.', 'Description', 'Unit Price', 'Amount']]
+    for item in sale.items:
+        items_data.append([
+            str(item.quantity),
+            item.product.name,
+            f'{item.price:.2f}',
+            f'{item.subtotal:.2f}'
+        ])
+
+    items_table = Table(items_data, colWidths=[0.75*inch, 3*inch, 1.25*inch, 1.5*inch])
+    items_table.setStyle(t.items_style)
+    elements.append(items_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Totals
+    subtotal = sum(item.subtotal for item in sale.items)
+    totals_data = [
+        ['', '', 'Subtotal:', f'R {subtotal:.2f}'],
+        ['', '', 'Tax:', f'R {sale.tax:.2f}'],
+        ['', '', '', ''],
+        ['', '', 'TOTAL:', f'R {sale.total:.2f}']
+    ]
+    totals_table = Table(totals_data, colWidths=[0.75*inch, 3*inch, 1.25*inch, 1.5*inch])
+    totals_table.setStyle(t.totals_style)
+    elements.append(totals_table)
+    elements.append(Spacer(1, 0.4*inch))
+
+    # Divider line
+    elements.append(HRFlowable(width="100%", thickness=1, color=t.medium_gray))
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Terms and Conditions
+    elements.append(Paragraph(FINE_PRINT_TEXT, t.fine_print_style))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Signature line
+    elements.append(Paragraph(f"Signature: {'_' * 60}", t.sig_style))
+
+    # Build PDF
+    doc.build(elements)
+    return buffer.getvalue()
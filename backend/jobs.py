@@ -0,0 +1,209 @@
+import random
+import signal
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from models import db, Job
+
+# kind -> function called with the job's payload as keyword arguments
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload, max_attempts=None):
+    # Adds the job to the current session, so it is only queued if the
+    # caller's transaction commits; the request pays for one INSERT and
+    # never for the work itself
+    job = Job(kind=kind, payload=payload, status='queued', attempts=0,
+              max_attempts=max_attempts or job_queue.max_attempts, run_at=datetime.utcnow())
+    db.session.add(job)
+    return job
+
+
+class JobQueue:
+    # Runs jobs from the jobs table in `flask run-worker` processes, each
+    # with `concurrency` threads, so any number of workers (on any host)
+    # share one queue. PostgreSQL hands each job to one worker with
+    # FOR UPDATE SKIP LOCKED; the conditional UPDATE that marks it running
+    # makes the claim safe on other databases too. A failed job is retried
+    # after an exponential, jittered backoff until max_attempts; a running
+    # job whose worker died is queued again after lock_timeout. Handlers may
+    # therefore run more than once and should tolerate it. Scheduled
+    # functions run in every worker process, so they must cope with several
+    # workers calling them at once.
+
+    def __init__(self):
+        self.concurrency = 4
+        self.poll_interval = 1.0
+        self.max_attempts = 5
+        self.retry_delay = 30
+        self.retry_max_delay = 3600
+        self.lock_timeout = timedelta(minutes=10)
+        self.error_delay = 5.0
+        self.error_max_delay = 60.0
+        self.scheduled = {}
+
+    def init_app(self, app):
+        self.concurrency = app.config['JOBS_CONCURRENCY']
+        self.poll_interval = app.config['JOBS_POLL_INTERVAL']
+        self.max_attempts = app.config['JOBS_MAX_ATTEMPTS']
+        self.retry_delay = app.config['JOBS_RETRY_DELAY']
+        self.retry_max_delay = app.config['JOBS_RETRY_MAX_DELAY']
+
+    def schedule(self, name, func, every):
+        # Calls func() in an app context every `every` (a timedelta) while
+        # a worker runs, starting when it starts
+        self.scheduled[name] = (func, every.total_seconds())
+
+    def backoff(self, attempts):
+        delay = min(self.retry_delay * 2 ** (attempts - 1), self.retry_max_delay)
+        return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+    def claim(self):
+        # Marks the next due job running and returns it, or None if none is due
+        while True:
+            now = datetime.utcnow()
+            with db.engine.begin() as conn:
+                job = conn.execute(
+                    db.select(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+                    .where(Job.status == 'queued', Job.run_at <= now)
+                    .order_by(Job.run_at, Job.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                ).first()
+                if job is None:
+                    return None
+                claimed = conn.execute(
+                    db.update(Job)
+                    .where(Job.id == job.id, Job.status == 'queued')
+                    .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+                ).rowcount
+            if claimed:
+                return SimpleNamespace(**dict(job._asdict(), attempts=job.attempts + 1))
+
+    def _finish(self, job_id, **values):
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Job).where(Job.id == job_id, Job.status == 'running').values(**values))
+
+    def run(self, job, logger):
+        func = HANDLERS.get(job.kind)
+        try:
+            if func is None:
+                raise LookupError(f'No handler for job kind {job.kind!r}')
+            func(**job.payload)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc()
+            if func is None or job.attempts >= job.max_attempts:
+                logger.error('Job %s (%s) failed permanently:\n%s', job.id, job.kind, error)
+                self._finish(job.id, status='failed', locked_at=None, last_error=error,
+                             finished_at=datetime.utcnow())
+            else:
+                retry_at = datetime.utcnow() + self.backoff(job.attempts)
+                logger.warning('Job %s (%s) failed on attempt %d; retrying at %s:\n%s',
+                               job.id, job.kind, job.attempts, retry_at.isoformat(), error)
+                self._finish(job.id, status='queued', locked_at=None, last_error=error, run_at=retry_at)
+        else:
+            self._finish(job.id, status='done', locked_at=None, finished_at=datetime.utcnow())
+        finally:
+            db.session.remove()
+
+    def _error_wait(self, stop, errors):
+        # Waits before retrying after the queue itself failed (e.g. the
+        # database is unreachable), longer after each failure in a row
+        stop.wait(min(self.error_delay * 2 ** (errors - 1), self.error_max_delay))
+
+    def recover(self):
+        # Queues jobs again whose worker stopped while running them
+        with db.engine.begin() as conn:
+            return conn.execute(
+                db.update(Job)
+                .where(Job.status == 'running', Job.locked_at < datetime.utcnow() - self.lock_timeout)
+                .values(status='queued', locked_at=None, run_at=datetime.utcnow())
+            ).rowcount
+
+    def work(self, app, concurrency=None, drain=False):
+        # Blocks running jobs until SIGINT/SIGTERM (jobs in progress are
+        # finished first), or with drain=True until no job is due
+        stop = threading.Event()
+        if not drain:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: stop.set())
+        try:
+            with app.app_context():
+                recovered = self.recover()
+        except Exception:
+            # The loops recover again from time to time, so a database that
+            # is not up yet only delays this
+            app.logger.exception('Could not requeue jobs left running by a stopped worker')
+        else:
+            if recovered:
+                app.logger.warning('Requeued %d jobs left running by a stopped worker', recovered)
+
+        threads = [
+            threading.Thread(target=self._loop, args=(app, stop, drain), name=f'job-worker-{n}')
+            for n in range(concurrency or self.concurrency)
+        ]
+        if self.scheduled and not drain:
+            threads.append(threading.Thread(target=self._schedule_loop, args=(app, stop), name='job-scheduler'))
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            stop.wait(0.5)
+        for thread in threads:
+            thread.join()
+
+    def _loop(self, app, stop, drain):
+        # A failure of the queue itself (claiming, recording an outcome,
+        # recovering) is logged and retried after a delay instead of ending
+        # the thread; a job whose outcome was not recorded stays running
+        # until recover() queues it again
+        errors = 0
+        while not stop.is_set():
+            try:
+                with app.app_context():
+                    job = self.claim()
+                    if job is not None:
+                        self.run(job, app.logger)
+                        errors = 0
+                        continue
+                    if not drain and random.random() < 0.01:
+                        self.recover()
+                errors = 0
+            except Exception:
+                errors += 1
+                app.logger.exception('Job worker failed; retrying')
+                if drain and errors >= 3:
+                    return
+                self._error_wait(stop, errors)
+                continue
+            if drain:
+                return
+            stop.wait(self.poll_interval)
+
+    def _schedule_loop(self, app, stop):
+        due = dict.fromkeys(self.scheduled, 0.0)
+        while not stop.is_set():
+            for name, (func, every) in self.scheduled.items():
+                if time.monotonic() < due[name]:
+                    continue
+                due[name] = time.monotonic() + every
+                try:
+                    with app.app_context():
+                        func()
+                except Exception:
+                    app.logger.exception('Scheduled %s failed; next run in %ds', name, every)
+            stop.wait(self.poll_interval)
+
+
+job_queue = JobQueue()
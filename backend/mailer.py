@@ -0,0 +1,62 @@
+import smtplib
+from email.message import EmailMessage
+
+import invoice
+from jobs import handler
+from models import Sale
+
+
+class Mailer:
+    # Sends mail through one SMTP server, a connection per message. Only
+    # background jobs send mail, so a slow or unreachable server delays and
+    # retries the job rather than a request.
+
+    def __init__(self):
+        self.host = 'localhost'
+        self.port = 25
+        self.username = None
+        self.password = None
+        self.starttls = False
+        self.timeout = 30
+        self.sender = None
+
+    def init_app(self, app):
+        self.host = app.config['SMTP_HOST'] or 'localhost'
+        self.port = app.config['SMTP_PORT']
+        self.username = app.config['SMTP_USERNAME']
+        self.password = app.config['SMTP_PASSWORD']
+        self.starttls = app.config['SMTP_STARTTLS']
+        self.timeout = app.config['SMTP_TIMEOUT']
+        self.sender = app.config['MAIL_FROM']
+
+    def send(self, message):
+        if 'From' not in message:
+            message['From'] = self.sender
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+
+mailer = Mailer()
+
+
+@handler('invoice_email')
+def send_invoice_email(sale_id):
+    sale = Sale.query_with_items().filter(Sale.id == sale_id).first()
+    if sale is None or not sale.customer_email:
+        return
+
+    message = EmailMessage()
+    message['To'] = sale.customer_email.strip()
+    message['Subject'] = f'Invoice {sale.invoice_number}'
+    message.set_content(
+        f"Dear {sale.customer_name or 'customer'},\n\n"
+        f"Thank you for your purchase. Your invoice {sale.invoice_number} "
+        f"for R {sale.total:.2f} is attached.\n"
+    )
+    message.add_attachment(invoice.get_invoice_pdf(sale), maintype='application', subtype='pdf',
+                           filename=f'{sale.invoice_number}.pdf')
+    mailer.send(message)
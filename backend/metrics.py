@@ -0,0 +1,183 @@
+import bisect
+import hmac
+import threading
+import time
+
+from flask import Response, current_app, request
+from sqlalchemy import event
+
+from models import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # counts are per bucket here and made cumulative when exported
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestMetrics:
+    # Per-route request latency, status counts and database usage for this
+    # process, exported in Prometheus text format. Each request costs one
+    # lock acquisition plus two clock reads per SQL statement. Under gunicorn
+    # every worker keeps its own figures, so /metrics describes the worker
+    # that answered; scrape each worker or run one per container to sum them.
+    # /metrics exists only when a token is configured, and the scraper must
+    # send it as a bearer token.
+
+    def __init__(self):
+        self.query_threshold = 20
+        self.token = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._latency = {}
+        self._queries = {}
+        self._responses = {}
+        self._db_seconds = {}
+        self._excess_queries = {}
+
+    def init_app(self, app):
+        self.query_threshold = app.config['METRICS_QUERY_THRESHOLD']
+        self.token = app.config['METRICS_TOKEN']
+        app.before_request(self._start)
+        app.after_request(self._status)
+        app.teardown_request(self._finish)
+        if self.token:
+            app.add_url_rule('/metrics', 'metrics', self.render)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_query)
+                event.listen(engine, 'after_cursor_execute', self._after_query)
+
+    # Request hooks
+
+    def _start(self):
+        local = self._local
+        local.started = time.perf_counter()
+        local.queries = 0
+        local.db_seconds = 0.0
+        local.status = 500
+
+    def _status(self, response):
+        self._local.status = response.status_code
+        return response
+
+    def _finish(self, exc=None):
+        local = self._local
+        started = getattr(local, 'started', None)
+        if started is None:
+            return
+        local.started = None
+        if request.endpoint == 'metrics':
+            return
+
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (request.method, route)
+        if local.queries > self.query_threshold:
+            current_app.logger.warning(
+                '%s %s issued %d queries (%.1f ms in the database); possible N+1',
+                request.method, request.path, local.queries, local.db_seconds * 1000
+            )
+
+        with self._lock:
+            latency = self._latency.get(key)
+            if latency is None:
+                latency = self._latency[key] = Histogram(LATENCY_BUCKETS)
+                self._queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            latency.observe(elapsed)
+            self._queries[key].observe(local.queries)
+            self._db_seconds[key] = self._db_seconds.get(key, 0.0) + local.db_seconds
+            status_key = key + (str(local.status),)
+            self._responses[status_key] = self._responses.get(status_key, 0) + 1
+            if local.queries > self.query_threshold:
+                self._excess_queries[key] = self._excess_queries.get(key, 0) + 1
+
+    # Engine hooks; statements outside a request (CLI, init_db) are ignored
+
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'started', None) is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is not None:
+            local = self._local
+            local.queries += 1
+            local.db_seconds += time.perf_counter() - started
+
+    # Export
+
+    def render(self):
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {self.token}'.encode('utf-8')):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer'})
+        with self._lock:
+            latency = {key: _copy(h) for key, h in self._latency.items()}
+            queries = {key: _copy(h) for key, h in self._queries.items()}
+            responses = dict(self._responses)
+            db_seconds = dict(self._db_seconds)
+            excess = dict(self._excess_queries)
+
+        lines = []
+        _histogram(lines, 'http_request_duration_seconds', 'Request latency by route', latency)
+        _counter(lines, 'http_requests_total', 'Responses by route and status', responses,
+                 ('method', 'route', 'status'))
+        _histogram(lines, 'db_queries_per_request', 'SQL statements issued per request', queries)
+        _counter(lines, 'db_query_duration_seconds_total', 'Time spent in SQL statements', db_seconds,
+                 ('method', 'route'))
+        _counter(lines, 'http_requests_excess_queries_total',
+                 f'Requests issuing more than {self.query_threshold} SQL statements', excess,
+                 ('method', 'route'))
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def _copy(histogram):
+    copy = Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.sum = histogram.sum
+    copy.count = histogram.count
+    return copy
+
+
+def _labels(names, values):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+
+
+def _histogram(lines, name, help_text, series):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(series.items()):
+        labels = _labels(('method', 'route'), key)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+def _counter(lines, name, help_text, series, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(series.items()):
+        lines.append(f'{name}{{{_labels(label_names, key)}}} {value}')
@@ -1,8 +1,44 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import UserMixin
+from sqlalchemy.schema import CreateIndex
 from datetime import datetime
 
-db = SQLAlchemy()
+class RoutingSession(Session):
+    # Reads go to the replica engine the current request was routed to (see
+    # replicas.py); flushes, DML and locking reads always use the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None and not getattr(clause, 'is_dml', False) \
+                    and getattr(clause, '_for_update_arg', None) is None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def registration_key(column):
+    # Registrations are matched with spaces and dashes stripped, upper-cased,
+    # so "ND 123-456" and "nd123456" are the same vehicle
+    return db.func.upper(db.func.replace(db.func.replace(column, ' ', ''), '-', ''))
+
+def normalize_registration(value):
+    return (value or '').replace(' ', '').replace('-', '').upper()
+
+def email_key(column):
+    return db.func.lower(db.func.trim(column))
+
+def normalize_email(value):
+    return (value or '').strip().lower()
+
+def create_indexes(bind):
+    # create_all() skips tables that already exist, so indexes added after a
+    # deployment's first start are created here instead
+    with bind.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -18,6 +54,61 @@ class User(UserMixin, db.Model):
             'username': self.username
         }
 
+# Invoice numbers come from this sequence on PostgreSQL and from a
+# block-allocated counter row elsewhere (see checkout.py)
+invoice_number_seq = db.Sequence('invoice_number_seq', metadata=db.metadata)
+
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    # One row per Idempotency-Key a user sent to POST /api/sales. sale_id is
+    # null while the first request is still being processed
+    user_id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    sale_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    # Background work queued in the same transaction as the change that
+    # caused it, run later by `flask run-worker`. A job is queued until a
+    # worker claims it (running, locked_at set), then done, or queued again
+    # with a later run_at after a failure, until max_attempts make it failed
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+class DashboardSummary(db.Model):
+    __tablename__ = 'dashboard_summary'
+    
+    # The totals are spread over a few slot rows that writers pick at random,
+    # so concurrent checkouts don't all queue on one row lock; readers sum them
+    slot = db.Column(db.Integer, primary_key=True)
+    total_products = db.Column(db.Integer, nullable=False, default=0)
+    low_stock_count = db.Column(db.Integer, nullable=False, default=0)
+    total_sales = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
 class Product(db.Model):
     __tablename__ = 'products'
     
@@ -32,7 +123,7 @@ class Product(db.Model):
     category = db.Column(db.String(100))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     sales = db.relationship('SaleItem', backref='product', lazy=True)
     
@@ -52,6 +143,72 @@ class Product(db.Model):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+    
+    @classmethod
+    def listing_columns(cls):
+        # The to_dict() fields as SQL expressions, so large listings can be
+        # serialized straight from result rows without building ORM objects.
+        # Datetimes are left to the app's JSON provider.
+        return [
+            cls.id, cls.name, cls.sku, cls.description,
+            db.cast(cls.price, db.Float).label('price'),
+            db.cast(cls.cost, db.Float).label('cost'),
+            cls.quantity, cls.min_stock, cls.category, cls.active,
+            db.type_coerce(cls.quantity <= cls.min_stock, db.Boolean).label('low_stock'),
+            cls.created_at, cls.updated_at,
+        ]
+
+def needs_reorder():
+    # Active products at or below their threshold. Queries must use this exact
+    # condition for the planner to match the partial index below
+    return db.and_(Product.active == db.true(), Product.quantity <= Product.min_stock)
+
+# Holds only the products needing reorder, so the reorder report and the
+# dashboard's low-stock count read a few index entries, not the whole table
+db.Index('ix_products_reorder', Product.id, postgresql_where=needs_reorder(), sqlite_where=needs_reorder())
+
+class ProductTombstone(db.Model):
+    __tablename__ = 'product_tombstones'
+    
+    # Left behind by delete_product so delta syncs can tell clients to drop
+    # a product they still hold
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class StockMovement(db.Model):
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_product_created', 'product_id', 'created_at'),
+    )
+    
+    # Append-only ledger of every change to a product's quantity. No foreign
+    # key, so the history outlives products that get deleted
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    change = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)
+    sale_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'change': self.change,
+            'reason': self.reason,
+            'sale_id': self.sale_id,
+            'created_at': self.created_at.isoformat()
+        }
+
+class StockSnapshot(db.Model):
+    __tablename__ = 'stock_snapshots'
+    
+    # Every product's quantity as of taken_at, so point-in-time queries only
+    # replay the movements since the previous snapshot
+    taken_at = db.Column(db.DateTime, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
 
 class Sale(db.Model):
     __tablename__ = 'sales'
@@ -73,6 +230,19 @@ class Sale(db.Model):
     
     items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        # Serves the newest-first keyset pagination of the sales listing
+        db.Index('ix_sales_created_at_id', 'created_at', 'id'),
+    )
+    
+    @classmethod
+    def query_with_items(cls):
+        # Items and their product names in one extra SELECT, so serializing
+        # with include_items=True costs two queries however many lines a sale has
+        return cls.query.options(
+            db.selectinload(cls.items).joinedload(SaleItem.product).load_only(Product.name)
+        )
+    
     def to_dict(self, include_items=False):
         data = {
             'id': self.id,
@@ -93,13 +263,32 @@ class Sale(db.Model):
         if include_items:
             data['items'] = [item.to_dict() for item in self.items]
         return data
+    
+    @classmethod
+    def listing_columns(cls):
+        # to_dict() without items, as SQL expressions (see Product.listing_columns)
+        return [
+            cls.id, cls.invoice_number, cls.customer_name, cls.customer_email,
+            cls.vehicle_make, cls.vehicle_model, cls.vehicle_registration, cls.vehicle_mileage,
+            db.cast(cls.total, db.Float).label('total'),
+            db.cast(cls.tax, db.Float).label('tax'),
+            db.cast(cls.discount, db.Float).label('discount'),
+            cls.payment_method, cls.status, cls.created_at,
+        ]
+
+db.Index('ix_sales_registration_key', registration_key(Sale.vehicle_registration))
+
+# Service history: one index range per vehicle or customer, already in the
+# newest-first keyset order the history endpoints page through
+db.Index('ix_sales_registration_history', registration_key(Sale.vehicle_registration), Sale.created_at, Sale.id)
+db.Index('ix_sales_email_history', email_key(Sale.customer_email), Sale.created_at, Sale.id)
 
 class SaleItem(db.Model):
     __tablename__ = 'sale_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     subtotal = db.Column(db.Numeric(10, 2), nullable=False)
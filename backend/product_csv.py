@@ -0,0 +1,225 @@
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import dashboard
+import events
+import stock_ledger
+from models import db, Product
+from reports import report_inputs_changed, REPORT_FIELDS
+
+CSV_FIELDS = ['sku', 'name', 'description', 'price', 'cost', 'quantity', 'min_stock', 'category', 'active']
+REQUIRED_FIELDS = ['sku', 'name', 'price']
+# Filled in for new products only; a blank cell or missing column leaves an
+# existing product's value unchanged
+DEFAULTS = {'description': '', 'cost': Decimal('0'), 'quantity': 0, 'min_stock': 5, 'category': '', 'active': True}
+
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+class CsvImportError(ValueError):
+    pass
+
+
+# Export
+
+def stream_products_csv(batch_size=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    rows = Product.query.order_by(Product.id).yield_per(batch_size)
+    for n, product in enumerate(rows, start=1):
+        writer.writerow([
+            product.sku, product.name, product.description or '', product.price, product.cost,
+            product.quantity, product.min_stock, product.category or '', 'true' if product.active else 'false'
+        ])
+        if n % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Import
+
+def _decimal(value, field):
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'{field} must be a number')
+    if not number.is_finite() or number < 0 or number >= Decimal('100000000'):
+        raise ValueError(f'{field} must be between 0 and 99999999.99')
+    return number.quantize(Decimal('0.01'))
+
+
+def _integer(value, field):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{field} must be a whole number')
+    if number < 0:
+        raise ValueError(f'{field} cannot be negative')
+    return number
+
+
+def _boolean(value, field):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes', 'y'):
+        return True
+    if lowered in ('false', '0', 'no', 'n'):
+        return False
+    raise ValueError(f'{field} must be true or false')
+
+
+PARSERS = {'price': _decimal, 'cost': _decimal, 'quantity': _integer, 'min_stock': _integer, 'active': _boolean}
+MAX_LENGTHS = {'sku': 100, 'name': 200, 'category': 100}
+
+
+def validate_row(raw, columns):
+    # Only the non-blank cells, parsed
+    row = {}
+    for field in columns:
+        value = (raw.get(field) or '').strip()
+        if not value:
+            if field in REQUIRED_FIELDS:
+                raise ValueError(f'{field} is required')
+            continue
+        if field in MAX_LENGTHS and len(value) > MAX_LENGTHS[field]:
+            raise ValueError(f'{field} is longer than {MAX_LENGTHS[field]} characters')
+        row[field] = PARSERS[field](value, field) if field in PARSERS else value
+    return row
+
+
+def import_products_csv(stream):
+    # Upserts products by sku from a CSV text stream, a batch at a time and
+    # committing per batch, so memory stays constant however long the file
+    # is. Returns counts and a per-row error report (first 1000 errors).
+    reader = csv.DictReader(stream)
+    header = [h.strip().lower() for h in (reader.fieldnames or [])]
+    missing = [f for f in REQUIRED_FIELDS if f not in header]
+    if missing:
+        raise CsvImportError(f'CSV header is missing required columns: {", ".join(missing)}')
+    reader.fieldnames = header
+    columns = [f for f in CSV_FIELDS if f in header]
+
+    upsert = _copy_upsert if db.engine.dialect.name == 'postgresql' else _batched_upsert
+    report = {'processed': 0, 'inserted': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+
+    batch = {}
+    for raw in reader:
+        report['processed'] += 1
+        try:
+            row = validate_row(raw, columns)
+        except ValueError as e:
+            report['error_count'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'line': reader.line_num, 'sku': raw.get('sku'), 'error': str(e)})
+            continue
+        # Rows repeating a sku within a batch are merged, later non-blank
+        # cells winning, since a blank cell means "leave unchanged"
+        batch.setdefault(row['sku'], {}).update(row)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            _apply_batch(upsert, list(batch.values()), columns, report)
+            batch = {}
+    if batch:
+        _apply_batch(upsert, list(batch.values()), columns, report)
+    return report
+
+
+def _stock_levels(skus, lock=False):
+    # With lock=True the existing rows are locked in id order, as checkout
+    # locks them, so no sale can change their stock before the batch commits
+    query = db.session.query(
+        Product.sku, Product.id, Product.quantity, Product.min_stock, Product.active
+    ).filter(Product.sku.in_(skus)).order_by(Product.id)
+    if lock:
+        query = query.with_for_update(key_share=True)
+    return {
+        sku: (product_id, quantity, min_stock, active)
+        for sku, product_id, quantity, min_stock, active in query
+    }
+
+
+def _apply_batch(upsert, rows, columns, report):
+    skus = [row['sku'] for row in rows]
+    before = _stock_levels(skus, lock=True)
+    inserted = upsert(rows, columns, datetime.utcnow())
+    after = _stock_levels(skus)
+
+    # Movements are what the import itself changed: the imported quantity
+    # against the locked level, or nothing where the cell was blank
+    imported = {row['sku']: row for row in rows}
+    stock_ledger.record_many([
+        (product_id, quantity if sku not in before
+         else imported[sku].get('quantity', before[sku][1]) - before[sku][1], 'import', None)
+        for sku, (product_id, quantity, _, _) in after.items()
+    ])
+    low_before = sum(dashboard.is_low_stock(q, m, a) for _, q, m, a in before.values())
+    low_after = sum(dashboard.is_low_stock(q, m, a) for _, q, m, a in after.values())
+    dashboard.record(total_products=inserted, low_stock_count=low_after - low_before)
+    # Too many rows to send individually; clients fetch a delta sync instead
+    events.publish('products_changed', {'count': len(rows)})
+    if inserted < len(rows) and any(f in columns for f in REPORT_FIELDS):
+        report_inputs_changed()
+    db.session.commit()
+    report['inserted'] += inserted
+    report['updated'] += len(rows) - inserted
+
+
+def _batched_upsert(rows, columns, now):
+    # Portable path: find which skus exist, then one executemany INSERT and
+    # one executemany UPDATE by primary key
+    existing = dict(db.session.query(Product.sku, Product.id).filter(Product.sku.in_([r['sku'] for r in rows])))
+    updated_fields = [f for f in columns if f != 'sku']
+
+    inserts = [dict(DEFAULTS, **row, created_at=now, updated_at=now) for row in rows if row['sku'] not in existing]
+    updates = [
+        dict({f: row[f] for f in updated_fields if f in row}, id=existing[row['sku']], updated_at=now)
+        for row in rows if row['sku'] in existing
+    ]
+    if inserts:
+        db.session.execute(db.insert(Product), inserts)
+    if updates:
+        db.session.execute(db.update(Product), updates)
+    return len(inserts)
+
+
+def _copy_upsert(rows, columns, now):
+    # PostgreSQL: COPY the batch into a temporary staging table, then merge
+    # it into products with a single INSERT ... ON CONFLICT. Blank cells are
+    # staged as NULL: new products get the default, existing ones keep their
+    # value. EXCLUDED already holds the defaults, so updates read the staged
+    # row itself (by its primary key) instead.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row.get(f) is None else row[f] for f in CSV_FIELDS])
+    buffer.seek(0)
+
+    connection = db.session.connection()
+    connection.execute(db.text(
+        "CREATE TEMP TABLE product_import_staging ("
+        "sku varchar(100) PRIMARY KEY, name varchar(200), description text, price numeric(10, 2), "
+        "cost numeric(10, 2), quantity integer, min_stock integer, category varchar(100), active boolean"
+        ") ON COMMIT DROP"
+    ))
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(
+        f"COPY product_import_staging ({', '.join(CSV_FIELDS)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+
+    fields = ', '.join(CSV_FIELDS)
+    values = ', '.join(f'COALESCE({f}, :default_{f})' if f in DEFAULTS else f for f in CSV_FIELDS)
+    assignments = ', '.join(
+        f'{f} = COALESCE((SELECT s.{f} FROM product_import_staging s WHERE s.sku = EXCLUDED.sku), products.{f})'
+        for f in columns if f != 'sku'
+    )
+    result = connection.execute(db.text(
+        f"INSERT INTO products ({fields}, created_at, updated_at) "
+        f"SELECT {values}, :now, :now FROM product_import_staging "
+        f"ON CONFLICT (sku) DO UPDATE SET {assignments}, updated_at = :now "
+        f"RETURNING (xmax = 0) AS inserted"
+    ), dict({f'default_{f}': value for f, value in DEFAULTS.items()}, now=now))
+    return sum(1 for (inserted,) in result if inserted)
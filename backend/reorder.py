@@ -0,0 +1,71 @@
+import math
+from datetime import datetime, timedelta
+
+from models import db, Product, Sale, SaleItem, needs_reorder
+
+DEFAULT_VELOCITY_DAYS = 30
+DEFAULT_COVER_DAYS = 14
+MAX_DAYS = 365
+
+
+def parse_days(value, default, name):
+    if value in (None, ''):
+        return default
+    try:
+        days = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+    if not 1 <= days <= MAX_DAYS:
+        raise ValueError(f'{name} must be between 1 and {MAX_DAYS}')
+    return days
+
+
+def reorder_report(velocity_days=DEFAULT_VELOCITY_DAYS, cover_days=DEFAULT_COVER_DAYS):
+    # Active products at or below min_stock, with units sold over the last
+    # velocity_days and a suggested order that covers cover_days of sales on
+    # top of min_stock. Most urgent (fewest days of stock left) first.
+    products = Product.query.filter(needs_reorder()).all()
+    if not products:
+        return []
+
+    since = datetime.utcnow() - timedelta(days=velocity_days)
+    reorder_ids = db.select(Product.id).where(needs_reorder())
+    sold = dict(
+        db.session.query(SaleItem.product_id, db.func.sum(SaleItem.quantity))
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .filter(Sale.created_at >= since, SaleItem.product_id.in_(reorder_ids))
+        .group_by(SaleItem.product_id)
+    )
+
+    rows = []
+    for product in products:
+        units = int(sold.get(product.id) or 0)
+        daily = units / velocity_days
+        target = math.ceil(daily * cover_days) + product.min_stock
+        rows.append({
+            'product': product,
+            'sold': units,
+            'daily_velocity': daily,
+            'days_of_stock': product.quantity / daily if daily else None,
+            'suggested_quantity': max(target - product.quantity, product.min_stock - product.quantity + 1),
+        })
+    rows.sort(key=lambda r: (r['days_of_stock'] is None, r['days_of_stock'] or 0, r['product'].id))
+    return rows
+
+
+def reorder_to_dict(row):
+    product = row['product']
+    return {
+        'id': product.id,
+        'sku': product.sku,
+        'name': product.name,
+        'category': product.category,
+        'quantity': product.quantity,
+        'min_stock': product.min_stock,
+        'cost': float(product.cost or 0),
+        'sold': row['sold'],
+        'daily_velocity': round(row['daily_velocity'], 2),
+        'days_of_stock': round(row['days_of_stock'], 1) if row['days_of_stock'] is not None else None,
+        'suggested_quantity': row['suggested_quantity'],
+        'reorder_cost': float((product.cost or 0) * row['suggested_quantity']),
+    }
@@ -0,0 +1,132 @@
+import random
+import threading
+import time
+
+from flask import current_app, g, request, session
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+
+READ_METHODS = ('GET', 'HEAD')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+LAST_WRITE_KEY = 'db_last_write'
+
+# Seconds a PostgreSQL standby is behind. A standby that has replayed
+# everything it received is current even if the primary has been idle (the
+# replay timestamp alone would then show ever-growing lag); a server that
+# isn't a standby reports 0.
+PG_LAG_QUERY = """
+    SELECT COALESCE(CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END, 0)
+"""
+
+
+class ReplicaRouter:
+    # Routes GET/HEAD requests to a read replica (SQLALCHEMY_BINDS keys
+    # starting with "replica") through models.RoutingSession. A background
+    # thread re-checks the replicas every check_interval seconds, so a
+    # replica that is slow to answer never holds up a request; replicas are
+    # skipped while more than max_lag behind or unreachable, and all of them
+    # while the checks themselves have stalled, in which case reads stay on
+    # the primary. A client that wrote within the last sticky_seconds reads
+    # from the primary, so it always sees its own sale or product change.
+
+    def __init__(self):
+        self.max_lag = 5.0
+        self.check_interval = 5.0
+        self.check_timeout = 2.0
+        self.sticky_seconds = 10.0
+        self._app = None
+        self._engines = {}
+        self._healthy = []
+        self._checked_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_lag = app.config['REPLICA_MAX_LAG']
+        self.check_interval = app.config['REPLICA_CHECK_INTERVAL']
+        self.check_timeout = app.config['REPLICA_CHECK_TIMEOUT']
+        self.sticky_seconds = app.config['READ_YOUR_WRITES_SECONDS']
+        keys = [key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica')]
+        if not keys:
+            return
+        self._app = app
+        with app.app_context():
+            self._engines = {key: db.engines[key] for key in keys}
+        self._healthy = []
+        self._checked_at = None
+        app.before_request(self._route)
+        app.after_request(self._after)
+
+    def lag(self, engine):
+        # Seconds behind the primary, or None if the replica can't be queried.
+        # Only PostgreSQL reports lag; other databases (SQLite stand-ins) are
+        # taken as current.
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == 'postgresql':
+                    conn.execute(db.text(f"SET LOCAL statement_timeout = '{int(self.check_timeout * 1000)}ms'"))
+                    return float(conn.execute(db.text(PG_LAG_QUERY)).scalar())
+                conn.execute(db.text('SELECT 1'))
+                return 0.0
+        except SQLAlchemyError as e:
+            current_app.logger.warning('Replica %s unavailable: %s', engine.url.render_as_string(), e)
+            return None
+
+    def check(self):
+        # Probes every replica and stores which are usable; returns them
+        healthy = []
+        for key, engine in self._engines.items():
+            lag = self.lag(engine)
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(key)
+            elif lag is not None:
+                current_app.logger.warning('Replica %s is %.1fs behind; reading from primary', key, lag)
+        self._healthy = healthy
+        self._checked_at = time.monotonic()
+        return healthy
+
+    def healthy(self):
+        # The replicas found usable by the last check, without waiting for
+        # one. The checking thread starts on first use, in the process that
+        # serves requests (gunicorn forks after create_app); until its first
+        # check, or if checks stop completing, reads use the primary.
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._check_loop, name='replica-check', daemon=True)
+                    self._thread.start()
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at > 3 * self.check_interval + self.check_timeout:
+            return []
+        return self._healthy
+
+    def _check_loop(self):
+        while True:
+            try:
+                with self._app.app_context():
+                    self.check()
+            except Exception:
+                self._app.logger.exception('Replica check failed')
+            time.sleep(self.check_interval)
+
+    def _route(self):
+        g.db_route = 'primary'
+        if request.method not in READ_METHODS:
+            return
+        last_write = session.get(LAST_WRITE_KEY)
+        if last_write and time.time() - last_write < self.sticky_seconds:
+            return
+        healthy = self.healthy()
+        if healthy:
+            g.db_route = random.choice(healthy)
+            g.db_replica = self._engines[g.db_route]
+
+    def _after(self, response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            session[LAST_WRITE_KEY] = time.time()
+        response.headers['X-DB-Route'] = g.get('db_route', 'primary')
+        return response
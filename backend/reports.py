@@ -0,0 +1,181 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from models import db, Counter, Product, Sale, SaleItem
+
+TIME_GROUPS = ('day', 'week', 'month')
+GROUPS = TIME_GROUPS + ('product', 'category', 'payment_method')
+MEASURES = ('sales', 'units', 'revenue', 'cost')
+
+# Reports read each product's current name, category and cost, so a change
+# to any of them bumps this counter; it is part of every cached report's key,
+# so all workers stop serving figures computed from the old values
+REPORT_INPUTS_COUNTER = 'report_inputs'
+REPORT_FIELDS = ('name', 'category', 'cost')
+
+
+class ReportError(ValueError):
+    pass
+
+
+def _bucket(group_by):
+    # Start of the day/week/month each sale falls in, as a sortable key.
+    # Weeks start on Monday in both dialects.
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.to_char(db.func.date_trunc(group_by, Sale.created_at), 'YYYY-MM-DD')
+    if group_by == 'day':
+        return db.func.strftime('%Y-%m-%d', Sale.created_at)
+    if group_by == 'week':
+        return db.func.date(Sale.created_at, 'weekday 0', '-6 days')
+    return db.func.strftime('%Y-%m-01', Sale.created_at)
+
+
+def _group_columns(group_by):
+    # (key, label) expressions
+    if group_by in TIME_GROUPS:
+        bucket = _bucket(group_by)
+        return bucket, bucket
+    if group_by == 'product':
+        return Product.id, Product.name
+    if group_by == 'category':
+        category = db.func.coalesce(Product.category, '')
+        return category, category
+    return Sale.payment_method, Sale.payment_method
+
+
+def _query(group_by, start, end):
+    # Revenue is the sum of item subtotals (before sale-level discount and
+    # tax); cost uses each product's current cost price
+    key, label = _group_columns(group_by)
+    rows = (
+        db.session.query(
+            key.label('key'),
+            label.label('label'),
+            db.func.count(db.func.distinct(Sale.id)),
+            db.func.sum(SaleItem.quantity),
+            db.func.sum(SaleItem.subtotal),
+            db.func.sum(SaleItem.quantity * db.func.coalesce(Product.cost, 0)),
+        )
+        .select_from(SaleItem)
+        .join(Sale, SaleItem.sale_id == Sale.id)
+        .join(Product, SaleItem.product_id == Product.id)
+        .filter(Sale.created_at >= start, Sale.created_at < end)
+        .group_by(key, label)
+        .all()
+    )
+    return {
+        row.key: {'key': row.key, 'label': row.label,
+                  **{m: Decimal(v or 0) for m, v in zip(MEASURES, row[2:])}}
+        for row in rows
+    }
+
+
+def init_report_inputs(bind):
+    with bind.begin() as conn:
+        exists = conn.execute(
+            db.select(Counter.value).where(Counter.name == REPORT_INPUTS_COUNTER)
+        ).scalar() is not None
+        if not exists:
+            conn.execute(db.insert(Counter).values(name=REPORT_INPUTS_COUNTER, value=0))
+
+
+def report_inputs_version():
+    return db.session.query(Counter.value).filter(Counter.name == REPORT_INPUTS_COUNTER).scalar() or 0
+
+
+def report_inputs_changed():
+    # In the caller's transaction, so cached reports are invalidated exactly
+    # when the product change commits
+    db.session.execute(
+        db.update(Counter).where(Counter.name == REPORT_INPUTS_COUNTER).values(value=Counter.value + 1)
+    )
+
+
+class ReportCache:
+    # Results for ranges that ended before today, keyed by the report inputs
+    # version; sales are never edited or backdated, so those figures only
+    # change when a product's name, category or cost does
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+closed_reports = ReportCache()
+
+
+def sales_report(group_by, start, end):
+    # Splits [start, end) at today's midnight (UTC, like created_at): the
+    # closed part comes from the cache, only today's part is queried live,
+    # and the two are merged group by group
+    if group_by not in GROUPS:
+        raise ReportError(f'group_by must be one of: {", ".join(GROUPS)}')
+    if end <= start:
+        raise ReportError('to must not be before from')
+
+    boundary = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    parts = []
+    if start < boundary:
+        closed_end = min(end, boundary)
+        parts.append(closed_reports.get_or_compute(
+            (db.engine.url.render_as_string(), report_inputs_version(), group_by, start, closed_end),
+            lambda: _query(group_by, start, closed_end)
+        ))
+    if end > boundary:
+        parts.append(_query(group_by, max(start, boundary), end))
+
+    merged = {}
+    for part in parts:
+        for key, row in part.items():
+            if key in merged:
+                merged[key] = dict(merged[key], **{m: merged[key][m] + row[m] for m in MEASURES})
+            else:
+                merged[key] = row
+
+    rows = [dict(row, margin=row['revenue'] - row['cost']) for row in merged.values()]
+    if group_by in TIME_GROUPS:
+        rows.sort(key=lambda r: r['key'])
+    else:
+        rows.sort(key=lambda r: r['revenue'], reverse=True)
+
+    totals = {m: sum((r[m] for r in rows), Decimal(0)) for m in MEASURES + ('margin',)}
+    if group_by in ('product', 'category'):
+        # A sale with several products counts once per group, so the
+        # per-group sale counts don't add up to a total
+        del totals['sales']
+    return rows, totals
+
+
+def totals_to_dict(totals):
+    return {m: int(v) if m in ('sales', 'units') else float(v) for m, v in totals.items()}
+
+
+def report_to_dict(row):
+    return {
+        'key': row['key'],
+        'label': row['label'],
+        'sales': int(row['sales']),
+        'units': int(row['units']),
+        'revenue': float(row['revenue']),
+        'cost': float(row['cost']),
+        'margin': float(row['margin'])
+    }
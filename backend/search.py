@@ -0,0 +1,111 @@
+import logging
+
+from sqlalchemy.exc import DBAPIError
+
+from models import db, Sale, registration_key, normalize_registration
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL: trigram GIN indexes let the ILIKE '%term%' predicates below use
+# an index scan instead of reading the whole sales table. Other databases
+# (SQLite in local development) run the same predicates unindexed.
+TRIGRAM_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_sales_customer_name_trgm ON sales USING gin (customer_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_invoice_number_trgm ON sales USING gin (invoice_number gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_registration_key_trgm ON sales USING gin "
+    "((upper(replace(replace(vehicle_registration, ' ', ''), '-', ''))) gin_trgm_ops)",
+]
+
+# SQLSTATEs for an extension the server doesn't have installed:
+# feature_not_supported (PostgreSQL 15+) and undefined_file (older)
+EXTENSION_MISSING = ('0A000', '58P01')
+
+_trigram_available = {}
+
+
+def create_search_indexes(bind):
+    if bind.dialect.name != 'postgresql':
+        return False
+    try:
+        with bind.begin() as conn:
+            conn.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except DBAPIError as e:
+        if getattr(e.orig, 'pgcode', None) not in EXTENSION_MISSING:
+            raise
+        logger.warning('pg_trgm is not installed; sales search falls back to unranked, unindexed matching: %s', e.orig)
+        return False
+    with bind.begin() as conn:
+        for statement in TRIGRAM_INDEXES:
+            conn.execute(db.text(statement))
+    _trigram_available.pop(str(bind.url), None)
+    return True
+
+
+def trigram_available(bind):
+    key = str(bind.url)
+    if key not in _trigram_available:
+        available = False
+        if bind.dialect.name == 'postgresql':
+            with bind.connect() as conn:
+                available = conn.execute(
+                    db.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).first() is not None
+        _trigram_available[key] = available
+    return _trigram_available[key]
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_filter(term):
+    pattern = f'%{_escape_like(term)}%'
+    conditions = [
+        Sale.customer_name.ilike(pattern, escape='\\'),
+        Sale.invoice_number.ilike(pattern, escape='\\'),
+    ]
+    reg = normalize_registration(term)
+    if reg:
+        conditions.append(registration_key(Sale.vehicle_registration).like(f'%{_escape_like(reg)}%', escape='\\'))
+    return db.or_(*conditions)
+
+
+def _rank(term):
+    reg = normalize_registration(term)
+    reg_key = registration_key(Sale.vehicle_registration)
+
+    if trigram_available(db.engine):
+        return db.func.greatest(
+            db.func.similarity(Sale.customer_name, term),
+            db.func.similarity(Sale.invoice_number, term),
+            db.func.similarity(reg_key, reg),
+        )
+
+    # Fallback ranking: exact match, then prefix match, then substring match
+    lowered = term.lower()
+    prefix = f'{_escape_like(lowered)}%'
+    return db.case(
+        (db.or_(db.func.lower(Sale.customer_name) == lowered,
+                db.func.lower(Sale.invoice_number) == lowered,
+                reg_key == reg), 3),
+        (db.or_(db.func.lower(Sale.customer_name).like(prefix, escape='\\'),
+                db.func.lower(Sale.invoice_number).like(prefix, escape='\\'),
+                reg_key.like(f'{_escape_like(reg)}%', escape='\\')), 2),
+        else_=1,
+    )
+
+
+def search_sales(term, page=1, limit=50):
+    # Ranked results can't be keyset-paginated on created_at, so search pages
+    # by offset; relevant matches are expected within the first few pages
+    rank = _rank(term).label('rank')
+    rows = (
+        db.session.query(Sale, rank)
+        .filter(search_filter(term))
+        .order_by(rank.desc(), Sale.created_at.desc(), Sale.id.desc())
+        .offset((page - 1) * limit)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    return [sale for sale, _ in rows[:limit]], has_more
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from models import db, Counter, Product, StockMovement, StockSnapshot
+
+# Movements are stamped when they are flushed, not when they commit, so a
+# snapshot taken right up to "now" could miss a slow transaction that commits
+# an earlier timestamp afterwards. Snapshots are taken this far in the past.
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+# Row locked while a snapshot is taken, so workers scheduling snapshots at
+# the same moment take one between them
+SNAPSHOT_COUNTER = 'stock_snapshot'
+
+
+def record(product_id, change, reason, sale_id=None):
+    record_many([(product_id, change, reason, sale_id)])
+
+
+def record_many(movements):
+    # movements is a list of (product_id, change, reason, sale_id); written in
+    # the caller's transaction with one executemany INSERT
+    rows = [
+        {'product_id': product_id, 'change': change, 'reason': reason, 'sale_id': sale_id}
+        for product_id, change, reason, sale_id in movements
+        if change
+    ]
+    if rows:
+        db.session.execute(db.insert(StockMovement), rows)
+
+
+def record_sale(sale, quantities):
+    # quantities maps product_id -> units sold, as returned by build_sale
+    if sale.id is None:
+        db.session.flush()
+    record_many([(product_id, -quantity, 'sale', sale.id) for product_id, quantity in quantities.items()])
+
+
+def latest_snapshot(at):
+    return db.session.query(db.func.max(StockSnapshot.taken_at)).filter(StockSnapshot.taken_at <= at).scalar()
+
+
+def _quantity_columns(at):
+    # (product_id, quantity) for every product as of `at`: the latest snapshot
+    # at or before it plus the movements between the two
+    base = latest_snapshot(at)
+    movements = db.select(StockMovement.product_id, db.func.sum(StockMovement.change).label('change')).where(
+        StockMovement.created_at <= at
+    )
+    if base is not None:
+        movements = movements.where(StockMovement.created_at > base)
+    movements = movements.group_by(StockMovement.product_id).subquery()
+    snapshot = db.select(StockSnapshot.product_id, StockSnapshot.quantity).where(
+        StockSnapshot.taken_at == base
+    ).subquery()
+
+    quantity = db.func.coalesce(snapshot.c.quantity, 0) + db.func.coalesce(movements.c.change, 0)
+    joins = [
+        (snapshot, snapshot.c.product_id == Product.id),
+        (movements, movements.c.product_id == Product.id),
+    ]
+    return base, quantity, joins
+
+
+def stock_at(at, product_id=None):
+    # Returns (snapshot used, [(product, quantity)]) for products that existed
+    # at `at` and still exist now; valuation uses each product's current cost
+    base, quantity, joins = _quantity_columns(at)
+    query = db.session.query(Product, quantity)
+    for target, condition in joins:
+        query = query.outerjoin(target, condition)
+    query = query.filter(Product.created_at <= at)
+    if product_id is not None:
+        query = query.filter(Product.id == product_id)
+    return base, query.order_by(Product.id).all()
+
+
+def stock_value(rows):
+    return sum((Decimal(str(product.cost or 0)) * quantity for product, quantity in rows), Decimal('0'))
+
+
+def take_snapshot(at=None, min_interval=timedelta(0)):
+    # Run periodically by the job worker (and by hand with `flask
+    # snapshot-stock`) so point-in-time queries replay at most one period of
+    # movements. Returns the snapshot time, or None if one already exists
+    # within min_interval before it.
+    at = at or datetime.utcnow() - SNAPSHOT_LAG
+    db.session.execute(
+        db.update(Counter).where(Counter.name == SNAPSHOT_COUNTER).values(value=Counter.value + 1)
+    )
+    newest = db.session.query(db.func.max(StockSnapshot.taken_at)).scalar()
+    if newest is not None and newest >= at - min_interval:
+        db.session.rollback()
+        return None
+
+    base, quantity, joins = _quantity_columns(at)
+    select = db.select(db.literal(at, db.DateTime), Product.id, quantity).select_from(Product)
+    for target, condition in joins:
+        select = select.outerjoin(target, condition)
+    select = select.where(Product.created_at <= at)
+    db.session.execute(
+        db.insert(StockSnapshot).from_select(['taken_at', 'product_id', 'quantity'], select)
+    )
+    db.session.commit()
+    return at
+
+
+def snapshot_if_due(interval):
+    # Scheduled in the job worker every few minutes; only one worker, once
+    # per interval, actually takes a snapshot
+    return take_snapshot(min_interval=interval)
+
+
+def init_ledger():
+    # The first snapshot records the quantities the products table already
+    # held before the ledger existed; later changes are movements on top of it
+    if db.session.query(Counter.value).filter(Counter.name == SNAPSHOT_COUNTER).scalar() is None:
+        db.session.add(Counter(name=SNAPSHOT_COUNTER, value=0))
+        db.session.commit()
+    if db.session.query(StockSnapshot.taken_at).first() is not None:
+        return
+    now = datetime.utcnow()
+    db.session.execute(
+        db.insert(StockSnapshot).from_select(
+            ['taken_at', 'product_id', 'quantity'],
+            db.select(db.literal(now, db.DateTime), Product.id, Product.quantity)
+        )
+    )
+    db.session.commit()
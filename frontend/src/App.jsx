@@ -1,7 +1,8 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 
 // Use runtime configuration from config.js
 const API_URL = window.ENV?.API_URL || '/api';
+const SALES_PAGE_SIZE = 100;
 
 function App() {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
@@ -247,6 +248,8 @@ function MainApp({ onLogout }) {
   const [activeTab, setActiveTab] = useState('dashboard');
   const [products, setProducts] = useState([]);
   const [sales, setSales] = useState([]);
+  const [salesCursor, setSalesCursor] = useState(null);
+  const [productsSyncToken, setProductsSyncToken] = useState(null);
   const [stats, setStats] = useState(null);
   const [cart, setCart] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -255,6 +258,70 @@ function MainApp({ onLogout }) {
     loadData();
   }, [activeTab]);
 
+  // Live changes from every till; while connected, other tills' writes patch
+  // local state from these events instead of reloading everything. This
+  // till's own writes are applied from their responses, since the event may
+  // arrive later (or, on a single-worker backend, not at all)
+  const liveRef = useRef(false);
+  const eventHandlerRef = useRef(null);
+  useEffect(() => {
+    const source = new EventSource(`${API_URL}/events`, { withCredentials: true });
+    source.onopen = () => { liveRef.current = true; };
+    source.onerror = () => { liveRef.current = false; };
+    source.onmessage = (e) => eventHandlerRef.current(JSON.parse(e.data));
+    return () => source.close();
+  }, []);
+
+  const applyEvent = ({ type, data }) => {
+    if (type === 'product') {
+      applyProductEvent(data);
+    } else if (type === 'product_deleted') {
+      setProducts(prev => mergeProducts(prev, [], [data.id]));
+    } else if (type === 'stock') {
+      const quantities = new Map(data.products.map(p => [p.id, p.quantity]));
+      setProducts(prev => prev.map(p => quantities.has(p.id)
+        ? { ...p, quantity: quantities.get(p.id), low_stock: quantities.get(p.id) <= p.min_stock }
+        : p));
+    } else if (type === 'sale') {
+      setSales(prev => prev.some(s => s.id === data.id) ? prev : [data, ...prev]);
+      setStats(prev => prev && {
+        ...prev,
+        recent_sales: [data, ...prev.recent_sales.filter(s => s.id !== data.id)].slice(0, 5)
+      });
+    } else if (type === 'dashboard') {
+      setStats(prev => prev && Object.keys(data).reduce(
+        (next, field) => ({ ...next, [field]: next[field] + data[field] }), prev));
+    } else if (type === 'products_changed') {
+      if (productsSyncToken) loadProducts();
+    } else if (type === 'resync') {
+      loadData();
+    }
+  };
+  eventHandlerRef.current = applyEvent;
+
+  // Product events carry only the fields patched in place plus a version
+  // (updated_at); a newer version means other fields may have changed too,
+  // so the full row is fetched
+  const applyProductEvent = async (data) => {
+    const current = products.find(p => p.id === data.id);
+    if (current && current.updated_at >= data.version) return;
+    const { version, ...fields } = data;
+    setProducts(prev => prev.map(p => p.id === data.id
+      ? { ...p, ...fields, low_stock: fields.quantity <= p.min_stock }
+      : p));
+    try {
+      const res = await fetch(`${API_URL}/products/${data.id}`, { credentials: 'include' });
+      if (!res.ok) return;
+      const product = await res.json();
+      // A lagging replica may still return the previous version
+      if (product.updated_at >= version) {
+        setProducts(prev => mergeProducts(prev, [product], []));
+      }
+    } catch (err) {
+      console.error('Error loading product:', err);
+    }
+  };
+
   const loadData = async () => {
     setLoading(true);
     try {
@@ -262,18 +329,13 @@ function MainApp({ onLogout }) {
         const res = await fetch(`${API_URL}/dashboard/stats`, { credentials: 'include' });
         const data = await res.json();
         setStats(data);
-      } else if (activeTab === 'inventory') {
-        const res = await fetch(`${API_URL}/products`, { credentials: 'include' });
-        const data = await res.json();
-        setProducts(data);
-      } else if (activeTab === 'pos') {
-        const res = await fetch(`${API_URL}/products`, { credentials: 'include' });
-        const data = await res.json();
-        setProducts(data);
+      } else if (activeTab === 'inventory' || activeTab === 'pos') {
+        await loadProducts();
       } else if (activeTab === 'sales') {
-        const res = await fetch(`${API_URL}/sales`, { credentials: 'include' });
+        const res = await fetch(`${API_URL}/sales?limit=${SALES_PAGE_SIZE}`, { credentials: 'include' });
         const data = await res.json();
-        setSales(data);
+        setSales(data.sales);
+        setSalesCursor(data.next_cursor);
       }
     } catch (err) {
       console.error('Error loading data:', err);
@@ -281,6 +343,36 @@ function MainApp({ onLogout }) {
     setLoading(false);
   };
 
+  // Full catalogue once, then only what changed since the last sync token
+  const loadProducts = async () => {
+    if (!productsSyncToken) {
+      const res = await fetch(`${API_URL}/products`, { credentials: 'include' });
+      const data = await res.json();
+      setProducts(data);
+      setProductsSyncToken(res.headers.get('X-Sync-Token'));
+      return;
+    }
+
+    const params = new URLSearchParams({ updated_since: productsSyncToken });
+    const res = await fetch(`${API_URL}/products?${params}`, { credentials: 'include' });
+    const data = await res.json();
+    setProducts(prev => mergeProducts(prev, data.products, data.deleted));
+    setProductsSyncToken(data.sync_token);
+  };
+
+  const loadMoreSales = async () => {
+    if (!salesCursor) return;
+    try {
+      const params = new URLSearchParams({ limit: SALES_PAGE_SIZE, cursor: salesCursor });
+      const res = await fetch(`${API_URL}/sales?${params}`, { credentials: 'include' });
+      const data = await res.json();
+      setSales(prev => [...prev, ...data.sales]);
+      setSalesCursor(data.next_cursor);
+    } catch (err) {
+      console.error('Error loading more sales:', err);
+    }
+  };
+
   const addProduct = async (product) => {
     try {
       const res = await fetch(`${API_URL}/products`, {
@@ -290,7 +382,9 @@ function MainApp({ onLogout }) {
         body: JSON.stringify(product)
       });
       if (res.ok) {
-        loadData();
+        const created = await res.json();
+        setProducts(prev => mergeProducts(prev, [created], []));
+        if (!liveRef.current) loadData();
         return true;
       }
     } catch (err) {
@@ -308,7 +402,9 @@ function MainApp({ onLogout }) {
         body: JSON.stringify(product)
       });
       if (res.ok) {
-        loadData();
+        const updated = await res.json();
+        setProducts(prev => mergeProducts(prev, [updated], []));
+        if (!liveRef.current) loadData();
         return true;
       }
     } catch (err) {
@@ -325,7 +421,8 @@ function MainApp({ onLogout }) {
         credentials: 'include'
       });
       if (res.ok) {
-        loadData();
+        setProducts(prev => mergeProducts(prev, [], [id]));
+        if (!liveRef.current) loadData();
         alert('Product deleted successfully!');
       } else {
         const data = await res.json();
@@ -345,34 +442,55 @@ function MainApp({ onLogout }) {
         credentials: 'include'
       });
       if (res.ok) {
-        loadData();
+        const updated = await res.json();
+        setProducts(prev => mergeProducts(prev, [updated], []));
+        if (!liveRef.current) loadData();
       }
     } catch (err) {
       console.error('Error toggling product status:', err);
     }
   };
 
+  // One Idempotency-Key per distinct checkout: retries of the same cart,
+  // automatic or by the operator, reuse it so a sale is never made twice
+  const checkoutRef = useRef({ body: null, key: null });
+
   const completeSale = async (saleData) => {
-    try {
-      const res = await fetch(`${API_URL}/sales`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        credentials: 'include',
-        body: JSON.stringify(saleData)
-      });
-      if (res.ok) {
-        const sale = await res.json();
-        setCart([]);
-        alert(`Sale completed! Invoice: ${sale.invoice_number}`);
-        return sale;
+    const body = JSON.stringify(saleData);
+    if (checkoutRef.current.body !== body) {
+      const key = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+      checkoutRef.current = { body, key };
+    }
+    for (let attempt = 1; attempt <= 3; attempt++) {
+      try {
+        const res = await fetch(`${API_URL}/sales`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json', 'Idempotency-Key': checkoutRef.current.key },
+          credentials: 'include',
+          body
+        });
+        if (res.ok) {
+          const sale = await res.json();
+          checkoutRef.current = { body: null, key: null };
+          setCart([]);
+          setSales(prev => prev.some(s => s.id === sale.id) ? prev : [sale, ...prev]);
+          // The response doesn't carry the new stock levels; a delta sync does
+          if (productsSyncToken) loadProducts();
+          alert(`Sale completed! Invoice: ${sale.invoice_number}`);
+          return sale;
+        }
+        // 409: the first attempt is still being processed; wait and ask again
+        if (res.status !== 409) return null;
+      } catch (err) {
+        console.error('Error completing sale:', err);
       }
-    } catch (err) {
-      console.error('Error completing sale:', err);
-      alert('Error completing sale');
+      await new Promise(resolve => setTimeout(resolve, 500 * attempt));
     }
+    alert('Error completing sale');
     return null;
   };
 
+
   const downloadInvoice = async (saleId) => {
     try {
       const res = await fetch(`${API_URL}/sales/${saleId}/invoice`, { credentials: 'include' });
@@ -465,7 +583,12 @@ function MainApp({ onLogout }) {
                 />
               )}
               {activeTab === 'sales' && (
-                <Sales sales={sales} onDownload={downloadInvoice} />
+                <Sales
+                  sales={sales}
+                  hasMore={!!salesCursor}
+                  onLoadMore={loadMoreSales}
+                  onDownload={downloadInvoice}
+                />
               )}
             </>
           )}
@@ -475,6 +598,13 @@ function MainApp({ onLogout }) {
   );
 }
 
+function mergeProducts(current, changed, deleted) {
+  const byId = new Map(current.map(p => [p.id, p]));
+  deleted.forEach(id => byId.delete(id));
+  changed.forEach(p => byId.set(p.id, p));
+  return [...byId.values()].sort((a, b) => a.id - b.id);
+}
+
 function TabButton({ active, onClick, children }) {
   return (
     <button onClick={onClick} style={{
@@ -569,8 +699,11 @@ function Inventory({ products, onAdd, onUpdate, onDelete, onToggleActive }) {
 
   const handleSubmit = async (e) => {
     e.preventDefault();
+    // Send quantity only when it was edited, so a sale made while the form
+    // was open isn't overwritten by the quantity it displayed
+    const { quantity, ...unchanged } = formData;
     const success = editingProduct
-      ? await onUpdate(editingProduct.id, formData)
+      ? await onUpdate(editingProduct.id, String(quantity) === String(editingProduct.quantity) ? unchanged : formData)
       : await onAdd(formData);
     
     if (success) {
@@ -1153,30 +1286,30 @@ function POS({ products, cart, setCart, onComplete }) {
   );
 }
 
-function Sales({ sales, onDownload }) {
+function Sales({ sales, hasMore, onLoadMore, onDownload }) {
   const [searchTerm, setSearchTerm] = useState('');
   const [filteredSales, setFilteredSales] = useState(sales);
 
+  // Search runs server-side against indexed columns, debounced per keystroke
   useEffect(() => {
-    setFilteredSales(sales);
-  }, [sales]);
-
-  const handleSearch = (term) => {
-    if (!term.trim()) {
+    const term = searchTerm.trim();
+    if (!term) {
       setFilteredSales(sales);
       return;
     }
-    
-    const search = term.toLowerCase();
-    const filtered = sales.filter(sale => {
-      return (
-        (sale.customer_name && sale.customer_name.toLowerCase().includes(search)) ||
-        (sale.vehicle_registration && sale.vehicle_registration.toLowerCase().includes(search)) ||
-        (sale.invoice_number && sale.invoice_number.toLowerCase().includes(search))
-      );
-    });
-    setFilteredSales(filtered);
-  };
+
+    const timer = setTimeout(async () => {
+      try {
+        const params = new URLSearchParams({ q: term, limit: SALES_PAGE_SIZE });
+        const res = await fetch(`${API_URL}/sales/search?${params}`, { credentials: 'include' });
+        const data = await res.json();
+        setFilteredSales(data.sales);
+      } catch (err) {
+        console.error('Error searching sales:', err);
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [searchTerm, sales]);
 
   return (
     <div>
@@ -1188,10 +1321,7 @@ function Sales({ sales, onDownload }) {
           type="text"
           placeholder="🔍 Search by customer name, registration, or invoice number..."
           value={searchTerm}
-          onChange={e => {
-            setSearchTerm(e.target.value);
-            handleSearch(e.target.value);
-          }}
+          onChange={e => setSearchTerm(e.target.value)}
           style={{
             ...inputStyle,
             width: '100%',
@@ -1262,6 +1392,24 @@ function Sales({ sales, onDownload }) {
             </table>
           </div>
         )}
+        {hasMore && !searchTerm && (
+          <div style={{ textAlign: 'center', marginTop: '1rem' }}>
+            <button
+              onClick={onLoadMore}
+              style={{
+                background: 'white',
+                color: '#667eea',
+                border: '1px solid #667eea',
+                padding: '0.5rem 1.5rem',
+                borderRadius: '6px',
+                cursor: 'pointer',
+                fontSize: '0.875rem'
+              }}
+            >
+              Load more
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );